@@ -1,5 +1,5 @@
 import speech_recognition as sr
-from textblob import TextBlob
+import sentiment_engine
 
 def detect_audio_emotion():
     recognizer = sr.Recognizer()
@@ -17,8 +17,7 @@ def detect_audio_emotion():
             return None
 
 def detect_text_emotion(text):
-    analysis = TextBlob(text)
-    polarity = analysis.sentiment.polarity
+    polarity = sentiment_engine.polarity(text)
     return "Positive" if polarity > 0 else "Negative" if polarity < 0 else "Neutral"
 
 if __name__ == "__main__":
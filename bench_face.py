@@ -0,0 +1,145 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+import detectors
+import face_pipeline
+from bench_text_emotion import percentile
+
+# Stage-by-stage benchmark of the face emotion path.
+#
+#   python bench_face.py
+#   python bench_face.py --classifiers keras,tflite --output results/new.json --compare results/bench_face.json
+#
+# Fixtures are the photos in static/images at their own size plus JPEG
+# copies resized to each --widths value. Every fixture is decoded from
+# bytes, searched for faces, cropped/preprocessed and classified, and each
+# stage is timed on its own. With --compare, any fixture whose total p50
+# grew by more than the threshold fails the run (exit code 1).
+
+IMAGES = os.path.join("static", "images", "*")
+STAGES = ("decode", "detect", "preprocess", "classify")
+
+
+def load_fixtures(paths, widths):
+    """(name, encoded bytes) for each photo at its own size and each smaller width."""
+    cv2 = detectors.get("cv2")
+    fixtures = []
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            print(f"Skipping {path}: not an image")
+            continue
+        name = os.path.splitext(os.path.basename(path))[0]
+        height, width = image.shape[:2]
+        fixtures.append((f"{name}@{width}", data))
+        for target in sorted(w for w in widths if w < width):
+            resized = cv2.resize(image, (target, round(height * target / width)), interpolation=cv2.INTER_AREA)
+            fixtures.append((f"{name}@{target}", cv2.imencode(".jpg", resized, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()))
+    return fixtures
+
+
+def time_stages(data, repeat):
+    cv2 = detectors.get("cv2")
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    times = {stage: [] for stage in STAGES}
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        image = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+        t1 = time.perf_counter()
+        boxes = face_pipeline.find_faces(image)
+        t2 = time.perf_counter()
+        crops, boxes = face_pipeline.face_crops(image, boxes)
+        t3 = time.perf_counter()
+        face_pipeline.classify(crops)
+        t4 = time.perf_counter()
+        for stage, seconds in zip(STAGES, (t1 - t0, t2 - t1, t3 - t2, t4 - t3)):
+            times[stage].append(seconds)
+
+    result = {"bytes": len(data), "width": image.shape[1], "height": image.shape[0], "faces": len(boxes)}
+    total = [sum(parts) for parts in zip(*times.values())]
+    for stage, values in list(times.items()) + [("total", total)]:
+        values.sort()
+        result[stage] = {
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "mean_ms": sum(values) / len(values) * 1000,
+        }
+    return result
+
+
+def run(fixtures, classifiers, repeat):
+    results = {}
+    print(f"{'fixture':<28}{'faces':>6}" + "".join(f"{stage:>12}" for stage in STAGES + ("total",)) + "  (p50 ms)")
+    for classifier in classifiers:
+        face_pipeline.CLASSIFIER = classifier
+        # Load the backends before timing, so the first fixture pays no import
+        face_pipeline.find_faces(np.zeros((64, 64, 3), dtype=np.uint8))
+        face_pipeline.classify(np.zeros((1, 64, 64), dtype=np.float32))
+        for name, data in fixtures:
+            result = time_stages(data, repeat)
+            results[f"{classifier}/{name}"] = result
+            print(f"{classifier + '/' + name:<28}{result['faces']:>6}"
+                  + "".join(f"{result[stage]['p50_ms']:>12.2f}" for stage in STAGES + ("total",)))
+        print(f"{classifier}: peak RSS {detectors._peak_rss_mb() or 0:.0f} MB")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Return the keys whose total p50 grew by more than threshold."""
+    regressions = []
+    for key, result in results.items():
+        before = baseline.get(key)
+        if before and result["total"]["p50_ms"] > before["total"]["p50_ms"] * (1 + threshold):
+            change = result["total"]["p50_ms"] / before["total"]["p50_ms"] - 1
+            print(f"REGRESSION {key}: {before['total']['p50_ms']:.2f} -> {result['total']['p50_ms']:.2f} ms ({change:+.1%})")
+            regressions.append(key)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the face emotion stages on static/images.")
+    parser.add_argument("images", nargs="*", help=f"photos (default: {IMAGES})")
+    parser.add_argument("--widths", default="320,640,1280", help="resized copies to add, by width")
+    parser.add_argument("--classifiers", default=face_pipeline.CLASSIFIER, help="keras and/or tflite")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=os.path.join("results", "bench_face.json"))
+    parser.add_argument("--compare", help="previous JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed total p50 growth, 0.10 = 10%%")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.images or sorted(glob.glob(IMAGES)), [int(w) for w in args.widths.split(",") if w])
+    results = run(fixtures, args.classifiers.split(","), args.repeat)
+    report = {
+        "timestamp": time.time(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {
+            "repeat": args.repeat,
+            "tf_intra_op_threads": os.getenv("TF_INTRA_OP_THREADS"),
+            "tf_inter_op_threads": os.getenv("TF_INTER_OP_THREADS"),
+            "cv2_threads": detectors.get("cv2").getNumThreads(),
+        },
+        "load": detectors.report(),
+        "peak_rss_mb": detectors._peak_rss_mb(),
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
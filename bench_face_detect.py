@@ -0,0 +1,202 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import detectors
+import face_detect
+from bench_text_emotion import percentile
+
+# Latency and recall of the face detector stages across input sizes.
+#
+#   python bench_face_detect.py --detectors haar,haar_scaled@480,haar_scaled@640,ssd@0,ssd@640
+#   python bench_face_detect.py --labels more_faces.json
+#
+# Fixtures are the photos in LABELS with hand-labelled faces (--labels adds
+# more: a JSON object of path -> [[x, y, w, h], ...]), plus "group": every
+# labelled face pasted at several sizes onto GROUP_BACKGROUND, a large photo
+# without faces, so recall can be read per face size. Each fixture is also
+# resized to every --widths value (labels scaled along). A detection matches
+# a labelled face when their IoU is at least --iou; unmatched detections
+# count as false positives.
+
+IMAGES = os.path.join("static", "images")
+# (x, y, w, h) of every face, in the photo's own pixels
+LABELS = {
+    os.path.join(IMAGES, "cs.jpg"): [],
+    os.path.join(IMAGES, "download (1).jpeg"): [(204, 75, 115, 125)],
+    os.path.join(IMAGES, "jim&pam.jpg"): [(616, 90, 108, 134), (508, 196, 63, 99)],
+    os.path.join(IMAGES, "jim.webp"): [(1131, 118, 138, 196), (934, 258, 133, 154)],
+    os.path.join(IMAGES, "listen.jpg"): [],
+    os.path.join(IMAGES, "mike.jpg"): [],
+}
+GROUP_BACKGROUND = os.path.join(IMAGES, "cs.jpg")
+GROUP_FACE_WIDTHS = (40, 64, 96, 144)
+
+
+def group_fixture(background, faces, face_widths=GROUP_FACE_WIDTHS):
+    """Paste each (image, box) face, with a margin, onto background at every face width.
+
+    Returns (image, truth boxes); faces that no longer fit are left out.
+    """
+    cv2 = detectors.get("cv2")
+    canvas = background.copy()
+    truth, left, top, row_height = [], 20, 20, 0
+    for source, (x, y, w, h) in faces:
+        margin = max(w, h) // 2
+        x1, y1 = max(0, x - margin), max(0, y - margin)
+        patch = source[y1:y + h + margin, x1:x + w + margin]
+        for face_width in face_widths:
+            scale = face_width / w
+            resized = cv2.resize(patch, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            if left + resized.shape[1] > canvas.shape[1]:
+                left, top, row_height = 20, top + row_height + 20, 0
+            if top + resized.shape[0] > canvas.shape[0]:
+                return canvas, truth
+            canvas[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+            truth.append((left + round((x - x1) * scale), top + round((y - y1) * scale),
+                          round(w * scale), round(h * scale)))
+            left += resized.shape[1] + 20
+            row_height = max(row_height, resized.shape[0])
+    return canvas, truth
+
+
+def load_fixtures(labels, widths):
+    """(name, image, truth boxes) for every labelled photo, the group image and their resized copies."""
+    cv2 = detectors.get("cv2")
+    originals = []
+    for path, truth in labels.items():
+        image = cv2.imread(path)
+        if image is None:
+            print(f"Skipping {path}: not an image")
+            continue
+        originals.append((os.path.splitext(os.path.basename(path))[0], image, [tuple(box) for box in truth]))
+    background = cv2.imread(GROUP_BACKGROUND)
+    faces = [(image, box) for _, image, truth in originals for box in truth]
+    if background is not None and faces:
+        originals.append(("group",) + group_fixture(background, faces))
+
+    fixtures = []
+    for name, image, truth in originals:
+        height, width = image.shape[:2]
+        fixtures.append((f"{name}@{width}", image, truth))
+        for target in sorted(w for w in widths if w < width):
+            scale = target / width
+            resized = cv2.resize(image, (target, round(height * scale)), interpolation=cv2.INTER_AREA)
+            fixtures.append((f"{name}@{target}", resized, [tuple(round(v * scale) for v in box) for box in truth]))
+    return fixtures
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    w = min(ax + aw, bx + bw) - max(ax, bx)
+    h = min(ay + ah, by + bh) - max(ay, by)
+    if w <= 0 or h <= 0:
+        return 0.0
+    return w * h / (aw * ah + bw * bh - w * h)
+
+
+def match(boxes, truth, threshold):
+    """(true positives, false positives); each labelled face matches at most one box."""
+    unmatched = list(truth)
+    hits = 0
+    for box in boxes:
+        best = max(unmatched, key=lambda t: iou(box, t), default=None)
+        if best is not None and iou(box, best) >= threshold:
+            unmatched.remove(best)
+            hits += 1
+    return hits, len(boxes) - hits
+
+
+def create(spec):
+    """A face_detect detector from "name" or "name@width" (haar_scaled, ssd)."""
+    name, _, width = spec.partition("@")
+    return face_detect.create(name, **({"width": int(width)} if width else {}))
+
+
+def run(fixtures, specs, repeat, threshold):
+    results = {}
+    print(f"{'fixture':<24}{'detector':<18}{'p50 ms':>9}{'found':>8}{'false +':>9}")
+    for spec in specs:
+        try:
+            detector = create(spec)
+        except (ImportError, OSError, ValueError, detectors.get("cv2").error) as e:
+            print(f"Skipping {spec}: {e}")
+            continue
+        detector.find_faces(fixtures[0][1])  # warm-up
+        for name, image, truth in fixtures:
+            times = []
+            for _ in range(repeat):
+                t = time.perf_counter()
+                boxes = [tuple(int(v) for v in box) for box in detector.find_faces(image)]
+                times.append(time.perf_counter() - t)
+            times.sort()
+            hits, false_positives = match(boxes, truth, threshold)
+            results[f"{spec}/{name}"] = {
+                "detector": spec, "fixture": name, "width": image.shape[1], "faces": len(truth),
+                "found": hits, "false_positives": false_positives,
+                "p50_ms": percentile(times, 50) * 1000, "p95_ms": percentile(times, 95) * 1000,
+            }
+            print(f"{name[:23]:<24}{spec:<18}{percentile(times, 50) * 1000:>9.1f}"
+                  f"{f'{hits}/{len(truth)}':>8}{false_positives:>9}")
+    return results
+
+
+def summarize(results):
+    """Recall, false positives and total p50 per detector, for native-size and each resized input."""
+    summary = {}
+    for result in results.values():
+        size = "native" if result["width"] == max(
+            r["width"] for r in results.values() if r["fixture"].split("@")[0] == result["fixture"].split("@")[0]) \
+            else str(result["width"])
+        entry = summary.setdefault(result["detector"], {}).setdefault(
+            size, {"faces": 0, "found": 0, "false_positives": 0, "p50_ms_total": 0.0})
+        for key in ("faces", "found", "false_positives"):
+            entry[key] += result[key]
+        entry["p50_ms_total"] += result["p50_ms"]
+    for sizes in summary.values():
+        for entry in sizes.values():
+            entry["recall"] = entry["found"] / entry["faces"] if entry["faces"] else None
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare face detector latency and recall across input sizes.")
+    parser.add_argument("--detectors", default="haar,haar_scaled@480,haar_scaled@640,ssd@0,ssd@640",
+                        help="haar, haar_scaled[@max width], ssd[@max width, 0 = 300x300]")
+    parser.add_argument("--labels", help="JSON of more labelled photos: path -> [[x, y, w, h], ...]")
+    parser.add_argument("--widths", default="320,640,1280", help="resized copies to add, by width")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--iou", type=float, default=0.3, help="overlap needed to count a face as found")
+    parser.add_argument("--output", default=os.path.join("results", "bench_face_detect.json"))
+    args = parser.parse_args()
+
+    labels = dict(LABELS)
+    if args.labels:
+        with open(args.labels) as f:
+            labels.update(json.load(f))
+    fixtures = load_fixtures(labels, [int(w) for w in args.widths.split(",") if w])
+    results = run(fixtures, args.detectors.split(","), args.repeat, args.iou)
+    summary = summarize(results)
+    print(f"\n{'detector':<18}{'input':>8}{'recall':>9}{'false +':>9}{'sum p50 ms':>12}")
+    for spec, sizes in summary.items():
+        for size in ["native"] + sorted((s for s in sizes if s != "native"), key=int, reverse=True):
+            entry = sizes.get(size)
+            if entry:
+                recall = f"{entry['found']}/{entry['faces']}"
+                print(f"{spec:<18}{size:>8}{recall:>9}{entry['false_positives']:>9}{entry['p50_ms_total']:>12.1f}")
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({
+            "timestamp": time.time(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "settings": {"repeat": args.repeat, "iou": args.iou, "cv2_threads": detectors.get("cv2").getNumThreads()},
+            "summary": summary,
+            "results": results,
+        }, f, indent=2)
+    print(f"Wrote {args.output}")
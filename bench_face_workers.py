@@ -0,0 +1,132 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import threading
+import time
+
+import detectors
+import face_pipeline
+from bench_text_emotion import summarize
+
+# Worker-count x TensorFlow-thread sweep for face emotion inference.
+#
+#   python bench_face_workers.py --workers 1,2,4 --threads 0,1,2 --pin 0,1
+#
+# Each configuration starts that many fresh worker processes (like gunicorn
+# workers), sizes their TensorFlow pools and optionally pins each one to its
+# own CPUs before FER is built, then serves a fixed number of requests with
+# every worker busy. Reported: throughput and the p50/p95/p99 latency of a
+# request while all workers compete for the cores. --threads 0 is
+# TensorFlow's default (one thread per core).
+#
+# Workers are spawned by default, so each starts from a clean interpreter.
+# gunicorn forks them from a master that has already imported the app;
+# --start-method fork does the same, preloading EAGER_DETECTORS (default
+# "text", as gunicorn.conf.py) in this process first.
+
+IMAGE = os.path.join("static", "images", "cs.jpg")
+
+
+def load_request(kind, image_path):
+    """A zero-argument callable doing one request's worth of face work."""
+    cv2 = detectors.get("cv2")
+    image = cv2.imread(image_path)
+    if kind == "detect":
+        detector = detectors.get("face")
+        return lambda: detector.detect_emotions(image)
+    boxes = face_pipeline.find_faces(image) or [(0, 0, min(image.shape[:2]), min(image.shape[:2]))]
+    crops, _ = face_pipeline.face_crops(image, boxes[:1])
+    return lambda: face_pipeline.classify(crops)
+
+
+def worker(index, workers, intra_op, inter_op, pin, kind, image_path, ready, tasks, results):
+    if pin:
+        detectors.pin_worker(index, workers)
+    detectors.configure_tensorflow(intra_op, inter_op)
+    request = load_request(kind, image_path)
+    request()  # warm up
+    ready.wait()
+    latencies = []
+    while tasks.get() is not None:
+        t = time.perf_counter()
+        request()
+        latencies.append(time.perf_counter() - t)
+    results.put(latencies)
+
+
+def run_config(workers, intra_op, inter_op, pin, kind, requests, image_path=IMAGE, start_method="spawn"):
+    ctx = multiprocessing.get_context(start_method)
+    ready = ctx.Barrier(workers + 1)
+    tasks, results = ctx.Queue(), ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(i, workers, intra_op, inter_op, pin, kind, image_path,
+                                              ready, tasks, results))
+             for i in range(workers)]
+    for p in procs:
+        p.start()
+    ready.wait(timeout=300)
+    start = time.perf_counter()
+    for _ in range(requests):
+        tasks.put(1)
+    for _ in range(workers):
+        tasks.put(None)
+    latencies = []
+    for _ in range(workers):
+        latencies.extend(results.get(timeout=600))
+    elapsed = time.perf_counter() - start
+    for p in procs:
+        p.join()
+    return summarize(latencies, len(latencies), elapsed)
+
+
+def sweep(worker_counts, thread_counts, inter_op, pins, kind, requests, start_method="spawn"):
+    results = {}
+    print(f"{'workers':>8}{'intra':>7}{'inter':>7}{'pinned':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for workers, intra_op, pin in itertools.product(worker_counts, thread_counts, pins):
+        try:
+            result = run_config(workers, intra_op, inter_op, pin, kind, requests, start_method=start_method)
+        except (queue.Empty, threading.BrokenBarrierError) as e:
+            print(f"{workers:>8}{intra_op:>7}{inter_op:>7}{pin!s:>8}  failed: {e!r}")
+            continue
+        results[f"w{workers}/intra{intra_op}/inter{inter_op}/{'pinned' if pin else 'unpinned'}"] = dict(
+            result, workers=workers, intra_op=intra_op, inter_op=inter_op, pinned=pin)
+        print(f"{workers:>8}{intra_op:>7}{inter_op:>7}{pin!s:>8}{result['ops_per_sec']:>10.1f}"
+              f"{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}")
+    return results
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep worker counts x TensorFlow thread settings.")
+    parser.add_argument("--workers", type=int_list, default=[1, 2, 4])
+    parser.add_argument("--threads", type=int_list, default=[0, 1, 2], help="intra-op threads, 0 = TF default")
+    parser.add_argument("--inter", type=int, default=1, help="inter-op threads, 0 = TF default")
+    parser.add_argument("--pin", type=int_list, default=[0], help="0 and/or 1: pin workers to CPUs")
+    parser.add_argument("--request", choices=("classify", "detect"), default="classify",
+                        help="classify one face crop, or run FER.detect_emotions on the whole photo")
+    parser.add_argument("--requests", type=int, default=200, help="requests per configuration")
+    parser.add_argument("--start-method", choices=("spawn", "fork"), default="spawn",
+                        help="fork: start workers from this process after preloading EAGER_DETECTORS, like gunicorn")
+    parser.add_argument("--output", default=os.path.join("results", "bench_face_workers.json"))
+    args = parser.parse_args()
+
+    if args.start_method == "fork":
+        detectors.preload(os.getenv("EAGER_DETECTORS", "text"))
+    results = sweep(args.workers, args.threads, args.inter, [bool(p) for p in args.pin],
+                    args.request, args.requests, args.start_method)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({
+            "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                        "cpus": len(detectors.worker_cpus(0, 1))},
+            "request": args.request,
+            "start_method": args.start_method,
+            "results": results,
+        }, f, indent=2)
+    print(f"Wrote {args.output}")
@@ -0,0 +1,184 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+import sentiment_engine
+from emotion_cache import ResultCache, text_key
+
+# Throughput and latency benchmark for detect_text_emotion backends.
+#
+#   python bench_text_emotion.py
+#   python bench_text_emotion.py --output results/new.json --compare results/bench_text_emotion.json --threshold 0.10
+#
+# The corpus is generated from a fixed vocabulary and seed, so runs on the
+# same machine are comparable. With --compare, any backend/corpus whose
+# ops/sec dropped by more than the threshold fails the run (exit code 1).
+
+VOCABULARY = (
+    "happy sad great terrible good bad love hate awesome awful nice boring "
+    "amazing horrible fine okay excited tired angry calm beautiful ugly fun "
+    "the a I you we it is was are feel feeling today really very so not no never "
+    "don't can't movie song day night work music friend weather this that and but "
+    "with about just again always sometimes maybe"
+).split()
+PUNCTUATION = [".", "!", "?", ",", "...", ":)", ":(", "<3"]
+
+CORPORA = {
+    # name: (number of texts, words per sentence, sentences per text)
+    "chat": (5000, (2, 10), (1, 1)),
+    "paragraph": (500, (8, 20), (3, 8)),
+    "document": (20, (8, 25), (200, 400)),
+}
+
+
+def generate_corpus(name, seed=1234):
+    """Deterministic synthetic texts for one corpus kind."""
+    count, words, sentences = CORPORA[name]
+    rng = random.Random(f"{name}-{seed}")
+    texts = []
+    for _ in range(count):
+        parts = []
+        for _ in range(rng.randint(*sentences)):
+            sentence = " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(*words)))
+            parts.append(sentence.capitalize() + rng.choice(PUNCTUATION))
+        texts.append(" ".join(parts))
+    return texts
+
+
+def textblob_backend():
+    from textblob import TextBlob
+    return lambda text: TextBlob(text).sentiment.polarity
+
+
+def engine_backend():
+    sentiment_engine.load()
+    return sentiment_engine.polarity
+
+
+def cached_backend():
+    sentiment_engine.load()
+    cache = ResultCache(maxsize=10000)
+    return lambda text: cache.lookup(text_key(text), lambda: sentiment_engine.polarity(text))
+
+
+def linear_backend():
+    import text_classifier
+    text_classifier.load()
+    return text_classifier.classify
+
+
+BACKENDS = {
+    "textblob": textblob_backend,
+    "engine": engine_backend,
+    "cached": cached_backend,
+    "linear": linear_backend,
+}
+
+
+def percentile(sorted_values, q):
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, items, elapsed):
+    latencies.sort()
+    return {
+        "ops_per_sec": items / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "items": items,
+    }
+
+
+def run_single(score, texts, repeat):
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            t = time.perf_counter()
+            score(text)
+            latencies.append(time.perf_counter() - t)
+    return summarize(latencies, len(texts) * repeat, time.perf_counter() - start)
+
+
+def run_batch(texts, repeat, batch_size=1000):
+    # Latency here is per batch call, throughput per text.
+    sentiment_engine.load()
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for k in range(0, len(texts), batch_size):
+            t = time.perf_counter()
+            sentiment_engine.polarities(texts[k:k + batch_size])
+            latencies.append(time.perf_counter() - t)
+    return summarize(latencies, len(texts) * repeat, time.perf_counter() - start)
+
+
+def run(backends, corpora, repeat=3, seed=1234):
+    results = {}
+    for corpus in corpora:
+        texts = generate_corpus(corpus, seed)
+        for name in backends:
+            if name == "engine_batch":
+                result = run_batch(texts, repeat)
+            else:
+                try:
+                    score = BACKENDS[name]()
+                except (ImportError, OSError) as e:
+                    print(f"Skipping {name}: {e}")
+                    continue
+                score(texts[0])  # warm up lazy loading
+                result = run_single(score, texts, repeat)
+            results[f"{name}/{corpus}"] = result
+            print(f"{name:<13}{corpus:<10}{result['ops_per_sec']:>12,.0f} ops/s"
+                  f"{result['p50_ms']:>9.3f}{result['p95_ms']:>9.3f}{result['p99_ms']:>9.3f} ms p50/p95/p99")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Return the keys whose throughput dropped by more than threshold."""
+    regressions = []
+    for key, result in results.items():
+        before = baseline.get(key)
+        if before and result["ops_per_sec"] < before["ops_per_sec"] * (1 - threshold):
+            change = result["ops_per_sec"] / before["ops_per_sec"] - 1
+            print(f"REGRESSION {key}: {before['ops_per_sec']:,.0f} -> {result['ops_per_sec']:,.0f} ops/s ({change:+.1%})")
+            regressions.append(key)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark text emotion backends.")
+    parser.add_argument("--backends", default="textblob,engine,engine_batch,cached,linear")
+    parser.add_argument("--corpora", default=",".join(CORPORA))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", default=os.path.join("results", "bench_text_emotion.json"))
+    parser.add_argument("--compare", help="previous JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed ops/sec drop, 0.10 = 10%%")
+    args = parser.parse_args()
+
+    results = run(args.backends.split(","), args.corpora.split(","), args.repeat, args.seed)
+    report = {
+        "timestamp": time.time(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": args.seed,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
@@ -0,0 +1,165 @@
+import logging
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+import detectors
+
+log = logging.getLogger("capture_service")
+
+
+def default_headless():
+    """Headless unless a display is available (or CAPTURE_HEADLESS says otherwise)."""
+    env = os.getenv("CAPTURE_HEADLESS")
+    if env is not None:
+        return env.lower() in ("1", "true", "yes")
+    return sys.platform.startswith("linux") and not os.getenv("DISPLAY")
+
+
+class CaptureService:
+    """Reads a camera on a background thread into a ring of preallocated frames.
+
+    The capture thread decodes straight into the ring slots with
+    cap.read(out), so no frame is allocated per read. Consumers always get
+    the newest frame; frames captured while inference was busy are counted
+    as dropped instead of queueing up. The frame returned by read() is a
+    view into the ring and stays valid until the next read() call.
+
+    In headless mode show() makes no GUI calls, for servers without a display.
+    """
+
+    def __init__(self, source=0, ring_size=4, headless=None, window="Facial Emotion Detection"):
+        self.source = source
+        self.ring_size = max(3, ring_size)  # newest, in use by the reader, being written
+        self.headless = default_headless() if headless is None else headless
+        self.window = window
+        self.cap = None
+        self.ring = None
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+        self._latest = -1   # slot holding the newest frame
+        self._reading = -1  # slot last handed to the reader
+        self._seq = 0       # frames captured so far
+        self._seen = 0      # seq of the frame last handed to the reader
+        self.delivered = 0
+        self.dropped = 0
+        self.stalls = 0     # read() timeouts while the camera was still running
+        self.error = None   # what stopped the capture thread, if it failed
+
+    def start(self):
+        """Open the camera and start capturing; returns False if it cannot be read."""
+        cv2 = detectors.get("cv2")
+        self.cap = cv2.VideoCapture(self.source)
+        if not self.cap.isOpened():
+            return False
+        ret, frame = self.cap.read()
+        if not ret:
+            self.cap.release()
+            return False
+        self.ring = np.empty((self.ring_size,) + frame.shape, dtype=frame.dtype)
+        self.ring[0] = frame
+        self._latest, self._seq = 0, 1
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="capture", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join()
+        if self.cap is not None:
+            self.cap.release()
+        if not self.headless:
+            detectors.get("cv2").destroyAllWindows()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def running(self):
+        """False once the camera stopped delivering frames or stop() was called."""
+        return self._running
+
+    def read(self, timeout=1.0):
+        """Newest frame not yet returned, or None once capture stops or times out.
+
+        A None while `running` is still True is only a slow camera.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > self._seen or not self._running, timeout):
+                self.stalls += 1
+                return None
+            if self._seq <= self._seen:
+                return None
+            self.dropped += self._seq - self._seen - 1
+            self.delivered += 1
+            self._seen = self._seq
+            self._reading = self._latest
+            return self.ring[self._reading]
+
+    def frames(self, timeout=1.0, deadline=None):
+        """Yield the newest frame each time the consumer is ready, until capture stops.
+
+        A stall longer than timeout is waited out, not taken as the end of the
+        stream. With a deadline, iteration also ends that many seconds after
+        it started, stalled camera or not.
+        """
+        end = time.monotonic() + deadline if deadline is not None else None
+        while True:
+            wait = timeout if end is None else max(0.0, min(timeout, end - time.monotonic()))
+            frame = self.read(wait)
+            if frame is not None:
+                yield frame
+            elif not self._running:
+                return
+            if end is not None and time.monotonic() >= end:
+                return
+
+    def show(self, frame):
+        """Display a frame; returns False when the user pressed 'q'. No-op when headless."""
+        if self.headless:
+            return True
+        cv2 = detectors.get("cv2")
+        cv2.imshow(self.window, frame)
+        return cv2.waitKey(1) & 0xFF != ord('q')
+
+    def stats(self):
+        return {"captured": self._seq, "delivered": self.delivered, "dropped": self.dropped,
+                "stalls": self.stalls, "error": repr(self.error) if self.error else None,
+                "headless": self.headless}
+
+    def _run(self):
+        try:
+            while self._running:
+                with self._cond:
+                    # Any slot except the newest frame and the one the reader holds
+                    slot = next(i for i in range(self.ring_size) if i not in (self._latest, self._reading))
+                out = self.ring[slot]
+                ret, frame = self.cap.read(out)
+                if ret and frame.ctypes.data != out.ctypes.data:
+                    out[...] = frame  # backend returned its own buffer (fails if the size changed)
+                with self._cond:
+                    if not ret:
+                        self._running = False
+                    else:
+                        self._latest = slot
+                        self._seq += 1
+                    self._cond.notify_all()
+        except Exception as e:
+            log.exception("Capture from %s failed", self.source)
+            self.error = e
+        finally:
+            # Readers wait for frames while _running; never leave them waiting on a dead thread
+            with self._cond:
+                self._running = False
+                self._cond.notify_all()
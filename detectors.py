@@ -0,0 +1,206 @@
+import importlib
+import logging
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Lazy registry for the emotion detection backends.
+# cv2, fer (TensorFlow/Keras) and speech_recognition are only imported the
+# first time a backend is requested, so a worker that only serves text
+# emotion never pays their startup time or memory. Backends listed in
+# EAGER_DETECTORS (e.g. "face,audio") can be loaded up front with preload().
+
+log = logging.getLogger("detectors")
+
+_loaders = {}
+_loaded = {}
+_timings = {}
+_lock = threading.RLock()
+
+
+def register(name, loader):
+    """Register a zero-argument loader that imports and builds a backend."""
+    _loaders[name] = loader
+
+
+def get(name):
+    """Return a backend, importing and initializing it on first use."""
+    backend = _loaded.get(name)
+    if backend is not None:
+        return backend
+    with _lock:
+        if name not in _loaded:
+            rss_before = _peak_rss_mb()
+            start = time.perf_counter()
+            _loaded[name] = _loaders[name]()
+            rss_after = _peak_rss_mb()
+            _timings[name] = {
+                "seconds": time.perf_counter() - start,
+                "peak_rss_mb": rss_after,
+                "peak_rss_growth_mb": rss_after - rss_before if rss_after is not None else None,
+            }
+        return _loaded[name]
+
+
+def is_loaded(name):
+    return name in _loaded
+
+
+def preload(names=None):
+    """Load the given backends now, by default those listed in EAGER_DETECTORS."""
+    if names is None:
+        names = os.getenv("EAGER_DETECTORS", "")
+    if isinstance(names, str):
+        names = [name.strip() for name in names.split(",") if name.strip()]
+    for name in names:
+        get(name)
+
+
+def report():
+    """Startup cost of every backend loaded so far, in load order."""
+    return dict(_timings)
+
+
+def configure_tensorflow(intra_op=None, inter_op=None):
+    """Size TensorFlow's thread pools, by default from TF_INTRA_OP_THREADS/TF_INTER_OP_THREADS.
+
+    Must run before TensorFlow executes its first op; 0 or unset keeps
+    TensorFlow's default of one thread per core, which oversubscribes the
+    machine once several workers each run a model.
+    """
+    intra_op = int(os.getenv("TF_INTRA_OP_THREADS", 0)) if intra_op is None else intra_op
+    inter_op = int(os.getenv("TF_INTER_OP_THREADS", 0)) if inter_op is None else inter_op
+    if not intra_op and not inter_op:
+        return
+    import tensorflow as tf
+    try:
+        if intra_op:
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op)
+        if inter_op:
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+    except RuntimeError as e:  # TensorFlow already initialized
+        log.warning("TensorFlow threads not configured: %s", e)
+        return
+    log.info("TensorFlow threads: intra-op %s, inter-op %s (pid %d)", intra_op or "default", inter_op or "default", os.getpid())
+
+
+def worker_cpus(index, workers, cpus=None):
+    """The slice of the available CPUs that worker `index` of `workers` should use."""
+    if cpus is None:
+        cpus = os.sched_getaffinity(0) if hasattr(os, "sched_getaffinity") else range(os.cpu_count() or 1)
+    cpus = sorted(cpus)
+    per_worker = max(1, len(cpus) // workers)
+    start = (index * per_worker) % len(cpus)
+    return cpus[start:start + per_worker]
+
+
+def pin_worker(index, workers):
+    """Pin this process to its worker_cpus(); returns them, or None where unsupported."""
+    if not hasattr(os, "sched_setaffinity"):
+        return None
+    cpus = worker_cpus(index, workers)
+    os.sched_setaffinity(0, cpus)
+    log.info("Worker %d of %d pinned to CPUs %s (pid %d)", index, workers, cpus, os.getpid())
+    return cpus
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _load_face():
+    # One FER detector per process, warmed with a dummy classification so the
+    # first real request only pays inference. Under gunicorn it is loaded in
+    # each worker after fork (WORKER_EAGER_DETECTORS), never in the master:
+    # TensorFlow is not fork-safe once it has run. FACE_CLASSIFIER=dnn swaps
+    # in the TensorFlow-free stand-in from face_dnn.py.
+    if os.getenv("FACE_CLASSIFIER") == "dnn":
+        return get("face_dnn")
+    import numpy as np
+
+    configure_tensorflow()
+    from fer import FER
+
+    start = time.perf_counter()
+    detector = FER(mtcnn=False)
+    loaded = time.perf_counter()
+    dummy = np.zeros((64, 64, 3), dtype=np.uint8)
+    detector.detect_emotions(dummy, face_rectangles=[(0, 0, 64, 64)])
+    warmed = time.perf_counter()
+    log.info("FER detector loaded in %.2fs, warmed in %.2fs (pid %d)", loaded - start, warmed - loaded, os.getpid())
+    return detector
+
+
+def _load_face_tflite():
+    # Int8 TFLite emotion classifier (FACE_CLASSIFIER=tflite), warmed like FER
+    import numpy as np
+    import face_tflite
+
+    start = time.perf_counter()
+    classifier = face_tflite.TFLiteClassifier(num_threads=int(os.getenv("TF_INTRA_OP_THREADS", 0)) or None)
+    classifier.classify(np.zeros((1, 64, 64), dtype=np.float32))
+    log.info("TFLite emotion model loaded in %.2fs (pid %d)", time.perf_counter() - start, os.getpid())
+    return classifier
+
+
+def _load_face_dnn():
+    # FER's emotion model frozen for cv2.dnn plus the face_detect.py stage; imports cv2 only
+    import numpy as np
+    import face_dnn
+
+    start = time.perf_counter()
+    detector = face_dnn.DnnDetector()
+    detector.classify(np.zeros((1, 64, 64), dtype=np.float32))
+    log.info("cv2.dnn emotion model loaded in %.2fs (pid %d)", time.perf_counter() - start, os.getpid())
+    return detector
+
+
+def _load_face_detector():
+    # The FACE_DETECTOR stage of face_pipeline.find_faces (see face_detect.py)
+    import face_detect
+
+    start = time.perf_counter()
+    name = os.getenv("FACE_DETECTOR", "haar")
+    detector = face_detect.create(name)
+    log.info("%s face detector loaded in %.2fs (pid %d)", name, time.perf_counter() - start, os.getpid())
+    return detector
+
+
+def _load_text():
+    import sentiment_engine
+    sentiment_engine.load()
+    return sentiment_engine
+
+
+register("cv2", lambda: importlib.import_module("cv2"))
+register("face", _load_face)
+register("face_tflite", _load_face_tflite)
+register("face_dnn", _load_face_dnn)
+register("face_detector", _load_face_detector)
+register("audio", lambda: importlib.import_module("speech_recognition"))
+register("text", _load_text)
+
+
+if __name__ == "__main__":
+    # Import-time report: python detectors.py [text cv2 face audio]
+    names = sys.argv[1:] or ["text", "cv2", "face", "audio"]
+    print(f"{'backend':<10}{'seconds':>10}{'peak RSS MB':>14}{'growth MB':>12}")
+    for name in names:
+        try:
+            get(name)
+        except ImportError as e:
+            print(f"{name:<10}  not available: {e}")
+            continue
+        t = _timings[name]
+        growth = t["peak_rss_growth_mb"]
+        print(f"{name:<10}{t['seconds']:>10.3f}{t['peak_rss_mb'] or 0:>14.1f}{growth or 0:>12.1f}")
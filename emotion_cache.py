@@ -0,0 +1,195 @@
+from collections import OrderedDict
+import hashlib
+import threading
+import time
+
+import numpy as np
+
+import detectors
+
+
+def text_key(text):
+    """Digest of the normalized text, used as the cache key.
+
+    Only surrounding whitespace is stripped: case and inner whitespace can
+    change how the tokenizer splits sentences, so they are kept.
+    """
+    return hashlib.blake2b(text.strip().encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+
+def content_key(data):
+    """Digest of uploaded bytes, for exact-duplicate lookups."""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def dhash(image, hash_size=8):
+    """64-bit difference hash of a BGR or grayscale image.
+
+    The image is shrunk to (hash_size + 1) x hash_size and each bit records
+    whether a pixel is brighter than its left neighbour, so small changes in
+    noise, exposure or compression flip only a few bits.
+    """
+    cv2 = detectors.get("cv2")
+    small = cv2.resize(image, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+class ResultCache:
+    """Thread-safe LRU cache with an optional TTL and hit/miss/eviction counters.
+
+    A maxsize of 0 disables the cache: lookups always call the function.
+    """
+
+    def __init__(self, maxsize=4096, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def lookup(self, key, compute):
+        """Return the cached value for key, calling compute() on a miss."""
+        if not self.enabled:
+            return compute()
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                if entry[0] is None or entry[0] > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._data[key]
+                self.expirations += 1
+            self.misses += 1
+
+        value = compute()
+        expires_at = now + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Counters for scraping, e.g. from a metrics endpoint."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class FrameCache:
+    """Bounded cache of results for near-identical frames.
+
+    Frames are keyed by their shape and dHash; a frame of the same shape
+    within max_distance differing bits of a recent frame reuses that frame's
+    result (face boxes included) instead of running detection again. The
+    newest entries are compared first and the least recently used one is
+    evicted past maxsize. A maxsize of 0 disables it.
+
+    The hash only sees a 9x8 thumbnail, so unrelated images can collide:
+    keep one cache per camera or session, never one shared by independent
+    uploads, and set a short ttl, since a changing expression in an
+    otherwise still scene may not move the hash either.
+    """
+
+    def __init__(self, maxsize=256, max_distance=4, ttl=None):
+        self.maxsize = maxsize
+        self.max_distance = max_distance
+        self.ttl = ttl
+        self.hits = 0
+        self.exact_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._data = OrderedDict()  # (shape, dhash) -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def lookup(self, image, compute):
+        """Return the result of a near-identical frame, calling compute() on a miss."""
+        if not self.enabled:
+            return compute()
+
+        key = (image.shape, dhash(image))
+        now = time.monotonic()
+        with self._lock:
+            match = key if key in self._data else self._nearest(key)
+            if match is not None:
+                expires_at, value = self._data[match]
+                if expires_at is None or expires_at > now:
+                    self._data.move_to_end(match)
+                    self.hits += 1
+                    self.exact_hits += match == key
+                    return value
+                del self._data[match]
+                self.expirations += 1
+            self.misses += 1
+
+        value = compute()
+        expires_at = now + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def _nearest(self, key):
+        shape, bits = key
+        for other in reversed(self._data):
+            if other[0] == shape and (bits ^ other[1]).bit_count() <= self.max_distance:
+                return other
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "max_distance": self.max_distance,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "exact_hits": self.exact_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,109 @@
+from concurrent.futures import Future
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+import face_pipeline
+
+
+class MicroBatcher:
+    """Gathers face crops from concurrent requests into one classifier call.
+
+    The first waiting request opens a batch; crops arriving within
+    window_ms join it until max_batch crops are collected (a request is
+    never split, so one larger than max_batch runs alone). The batch runs
+    as a single predict and each request gets its own rows back.
+    """
+
+    def __init__(self, window_ms=10, max_batch=32, classify=None):
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._classify = classify or face_pipeline.classify
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._carry = None  # request that did not fit in the previous batch
+        self._lock = threading.Lock()  # the batch thread's startup and the counters below
+        self.batches = 0
+        self.faces = 0
+        self.batch_sizes = {}  # faces per batch -> number of batches
+        self.max_queue_depth = 0
+
+    def submit(self, crops):
+        """Queue preprocessed crops and return a Future of their (n, 7) scores."""
+        future = Future()
+        if len(crops) == 0:
+            future.set_result(np.empty((0, len(face_pipeline.LABELS)), dtype=np.float32))
+            return future
+        self._ensure_thread()
+        self._queue.put((crops, future))
+        depth = self._queue.qsize()
+        with self._lock:
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+        return future
+
+    def classify(self, crops):
+        return self.submit(crops).result()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self.max_queue_depth,
+                "batches": self.batches,
+                "faces": self.faces,
+                "mean_batch_size": self.faces / self.batches if self.batches else 0.0,
+                "batch_sizes": dict(sorted(self.batch_sizes.items())),
+            }
+
+    def _ensure_thread(self):
+        # Threads do not survive fork, so each (gunicorn) worker starts its own.
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                self._queue = queue.Queue()
+                self._carry = None
+                self._thread = threading.Thread(target=self._run, name="face-batcher", daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            first, self._carry = self._carry or self._queue.get(), None
+            pending = [first]
+            size = len(first[0])
+            deadline = time.perf_counter() + self.window
+            while size < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if size + len(item[0]) > self.max_batch:
+                    self._carry = item
+                    break
+                pending.append(item)
+                size += len(item[0])
+
+            try:
+                scores = self._classify(np.concatenate([crops for crops, _ in pending]))
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+
+            # Counted before any caller is released, so its own batch is in stats()
+            with self._lock:
+                self.batches += 1
+                self.faces += size
+                self.batch_sizes[size] = self.batch_sizes.get(size, 0) + 1
+            start = 0
+            for crops, future in pending:
+                future.set_result(scores[start:start + len(crops)])
+                start += len(crops)
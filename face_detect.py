@@ -0,0 +1,151 @@
+import argparse
+import hashlib
+import importlib.util
+import os
+import threading
+import urllib.request
+
+import numpy as np
+
+import detectors
+
+# Face detector stage for face_pipeline.find_faces, chosen by FACE_DETECTOR:
+#   haar         FER's Haar cascade on the full-resolution image (FER's own behaviour)
+#   haar_scaled  the same cascade on a copy at most FACE_DETECT_WIDTH pixels wide,
+#                boxes scaled back to the original image
+#   ssd          OpenCV's res10 SSD/ResNet face detector on a copy at most
+#                FACE_SSD_WIDTH pixels wide (0: the sample's fixed 300x300 blob)
+# Detectors only return boxes in original-image coordinates, so the emotion
+# classifier still gets its crop from the full-resolution image. The SSD
+# files (deploy.prototxt, res10_300x300_ssd_iter_140000.caffemodel) are the
+# ones from OpenCV's dnn face_detector sample and are not in the repository:
+# `python face_detect.py download` fetches them into models/ (git-ignored).
+#
+# Every app path finds faces through face_pipeline.find_faces and so uses
+# this stage; only the benchmarks that time FER itself (bench_face_workers
+# --request detect, face_dnn compare) call FER's detect_emotions directly.
+
+SCALE_FACTOR = 1.1     # FER.__init__ defaults
+MIN_NEIGHBORS = 5
+MIN_FACE_SIZE = 50
+CASCADE_WINDOW = 24    # the cascade's own window; smaller minSize finds nothing more
+DETECT_WIDTH = int(os.getenv("FACE_DETECT_WIDTH", 640))
+MODELS = os.path.join(os.path.dirname(__file__), "models")
+SSD_PROTOTXT = os.getenv("FACE_SSD_PROTOTXT", os.path.join(MODELS, "deploy.prototxt"))
+SSD_MODEL = os.getenv("FACE_SSD_MODEL", os.path.join(MODELS, "res10_300x300_ssd_iter_140000.caffemodel"))
+# Where download() gets them, with the SHA-1 OpenCV's download_models.py checks for the weights
+SSD_PROTOTXT_URL = "https://raw.githubusercontent.com/opencv/opencv/4.x/samples/dnn/face_detector/deploy.prototxt"
+SSD_MODEL_URL = ("https://raw.githubusercontent.com/opencv/opencv_3rdparty/dnn_samples_face_detector_20170830/"
+                 "res10_300x300_ssd_iter_140000.caffemodel")
+SSD_MODEL_SHA1 = "15aa726b4d46d9f023526d85537db81cbc8dd566"
+SSD_CONFIDENCE = float(os.getenv("FACE_SSD_CONFIDENCE", 0.5))
+# 300x300 squeezes a 1920-wide photo 6x and loses faces under ~150 px
+SSD_WIDTH = int(os.getenv("FACE_SSD_WIDTH", 640))
+SSD_SIZE = (300, 300)
+SSD_MEAN = (104.0, 177.0, 123.0)
+
+
+def cascade_path():
+    """FER's bundled Haar cascade, located without importing fer (and TensorFlow)."""
+    spec = importlib.util.find_spec("fer")
+    if spec is None or not spec.submodule_search_locations:
+        raise ImportError("fer is not installed; its Haar cascade is needed for face detection")
+    return os.path.join(list(spec.submodule_search_locations)[0], "data", "haarcascade_frontalface_default.xml")
+
+
+class HaarDetector:
+    """FER's Haar cascade, optionally run on a copy at most max_width wide."""
+
+    def __init__(self, max_width=0, cascade=None):
+        cv2 = detectors.get("cv2")
+        self.max_width = max_width
+        self.cascade = cv2.CascadeClassifier(cascade or cascade_path())
+        if self.cascade.empty():
+            raise OSError(f"Could not load Haar cascade {cascade or cascade_path()}")
+
+    def find_faces(self, img, bgr=True):
+        """Face boxes (x, y, w, h) in img's own coordinates, like FER.find_faces."""
+        cv2 = detectors.get("cv2")
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if bgr else img
+        height, width = gray.shape[:2]
+        scale = self.max_width / width if self.max_width and width > self.max_width else 1.0
+        if scale < 1.0:
+            gray = cv2.resize(gray, (self.max_width, max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+        # Keep the smallest face the same size relative to the original image
+        min_size = max(CASCADE_WINDOW, round(MIN_FACE_SIZE * scale))
+        faces = self.cascade.detectMultiScale(gray, scaleFactor=SCALE_FACTOR, minNeighbors=MIN_NEIGHBORS,
+                                              flags=cv2.CASCADE_SCALE_IMAGE, minSize=(min_size, min_size))
+        if scale == 1.0 or len(faces) == 0:
+            return faces
+        return np.round(np.asarray(faces) / scale).astype(int)
+
+
+class SsdDetector:
+    """OpenCV's res10 SSD/ResNet face detector on a copy at most width wide (0: 300x300)."""
+
+    def __init__(self, width=SSD_WIDTH, confidence=SSD_CONFIDENCE, prototxt=SSD_PROTOTXT, model=SSD_MODEL):
+        cv2 = detectors.get("cv2")
+        self.net = cv2.dnn.readNetFromCaffe(prototxt, model)
+        self.width = width
+        self.confidence = confidence
+        self._lock = threading.Lock()  # a cv2.dnn.Net is not thread-safe
+
+    def find_faces(self, img, bgr=True):
+        """Face boxes (x, y, w, h) with confidence >= self.confidence; gray input is accepted."""
+        cv2 = detectors.get("cv2")
+        if not bgr or img.ndim == 2:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        height, width = img.shape[:2]
+        if self.width:
+            # The network is fully convolutional: keep the aspect ratio, never upscale
+            scale = min(1.0, self.width / width)
+            size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        else:
+            size = SSD_SIZE
+        small = cv2.resize(img, size, interpolation=cv2.INTER_AREA) if size != (width, height) else img
+        blob = cv2.dnn.blobFromImage(small, 1.0, size, SSD_MEAN)
+        with self._lock:
+            self.net.setInput(blob)
+            detections = self.net.forward()[0, 0]  # rows of (_, _, confidence, x1, y1, x2, y2)
+        detections = detections[detections[:, 2] >= self.confidence]
+        corners = np.clip(detections[:, 3:7], 0.0, 1.0) * (width, height, width, height)
+        boxes = [(int(x1), int(y1), int(x2 - x1), int(y2 - y1)) for x1, y1, x2, y2 in np.round(corners)]
+        return [box for box in boxes if box[2] > 0 and box[3] > 0]
+
+
+def create(name, **kwargs):
+    """A detector by FACE_DETECTOR name; width overrides FACE_DETECT_WIDTH / FACE_SSD_WIDTH."""
+    if name == "haar":
+        return HaarDetector(**kwargs)
+    if name == "haar_scaled":
+        return HaarDetector(kwargs.pop("width", DETECT_WIDTH), **kwargs)
+    if name == "ssd":
+        return SsdDetector(kwargs.pop("width", SSD_WIDTH), **kwargs)
+    raise ValueError(f"Unknown face detector {name!r}; expected haar, haar_scaled or ssd")
+
+
+def download(prototxt=SSD_PROTOTXT, model=SSD_MODEL, force=False):
+    """Fetch the SSD files to the given paths; existing files are kept unless force."""
+    for url, path, sha1 in ((SSD_PROTOTXT_URL, prototxt, None), (SSD_MODEL_URL, model, SSD_MODEL_SHA1)):
+        if os.path.exists(path) and not force:
+            print(f"{path} already exists")
+            continue
+        with urllib.request.urlopen(url, timeout=60) as response:
+            data = response.read()
+        if sha1 and hashlib.sha1(data).hexdigest() != sha1:
+            raise OSError(f"{url}: SHA-1 mismatch, expected {sha1}")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        print(f"Wrote {path} ({len(data) / 1024:.0f} KiB)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Face detector stage utilities.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("download", help="fetch the SSD face detector files into models/")
+    p.add_argument("--force", action="store_true", help="download again even if the files exist")
+    args = parser.parse_args()
+    download(force=args.force)
@@ -0,0 +1,199 @@
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+import detectors
+import face_pipeline
+from face_tflite import IMAGES, _rss_mb, image_crops, keras_model
+
+# FER's emotion CNN as a frozen TensorFlow graph, run through cv2.dnn.
+# `python face_dnn.py export` freezes the Keras model FER loads (this step
+# needs TensorFlow); after that, FACE_CLASSIFIER=dnn makes
+# detectors.get("face") return a DnnDetector, which finds faces with the
+# face_detect.py stage (FER's own Haar cascade by default) and classifies
+# with OpenCV, so the face path never imports TensorFlow.
+# `python face_dnn.py compare` reports startup time, RSS and per-image
+# latency against FER.
+
+MODEL_PATH = os.getenv("FACE_DNN_MODEL", os.path.join(os.path.dirname(__file__), "models", "fer_emotion.pb"))
+
+
+class DnnDetector:
+    """The parts of FER the app uses, backed by cv2 only.
+
+    find_faces, detect_emotions, top_emotion and _classify_emotions behave
+    like FER's, so it can stand in wherever detectors.get("face") is used.
+    """
+
+    def __init__(self, path=MODEL_PATH, face_detector=None):
+        cv2 = detectors.get("cv2")
+        self.net = cv2.dnn.readNetFromTensorflow(path)
+        self.face_detector = face_detector or detectors.get("face_detector")
+        self._lock = threading.Lock()  # a cv2.dnn.Net is not thread-safe
+
+    def classify(self, crops):
+        """Emotion probabilities, shape (n, 7), like face_pipeline.classify."""
+        if len(crops) == 0:
+            return np.empty((0, len(face_pipeline.LABELS)), dtype=np.float32)
+        blob = np.ascontiguousarray(crops[:, None, :, :], dtype=np.float32)  # NCHW
+        with self._lock:
+            self.net.setInput(blob)
+            return self.net.forward().copy()
+
+    _classify_emotions = classify
+
+    def find_faces(self, img, bgr=True):
+        """Face boxes (x, y, w, h), as FER.find_faces."""
+        return self.face_detector.find_faces(img, bgr=bgr)
+
+    def detect_emotions(self, img, face_rectangles=None):
+        """[{"box", "emotions"}] for every face in a BGR image, as FER.detect_emotions."""
+        if face_rectangles is None:
+            face_rectangles = self.find_faces(img, bgr=True)
+        boxes = [tuple(int(v) for v in box) for box in face_rectangles]
+        crops, boxes = face_pipeline.face_crops(img, boxes)
+        return [{"box": list(box), "emotions": face_pipeline.label_scores(row)}
+                for box, row in zip(boxes, self.classify(crops))]
+
+    def top_emotion(self, img):
+        """(emotion, score) of the first face, or (None, None)."""
+        faces = self.detect_emotions(img)
+        if not faces:
+            return None, None
+        emotions = faces[0]["emotions"]
+        emotion = max(emotions, key=emotions.get)
+        return emotion, emotions[emotion]
+
+
+def export(path=MODEL_PATH):
+    """Freeze FER's Keras emotion model into a graph cv2.dnn can read; returns its size."""
+    import tensorflow as tf
+    from tensorflow.core.protobuf import config_pb2, meta_graph_pb2
+    from tensorflow.python.framework.convert_to_constants import convert_variables_to_constants_v2
+    from tensorflow.python.grappler import tf_optimizer
+
+    model = keras_model()
+
+    @tf.function(input_signature=[tf.TensorSpec([None, 64, 64, 1], tf.float32, name="input")])
+    def serve(x):
+        return model(x, training=False)
+
+    frozen = convert_variables_to_constants_v2(serve.get_concrete_function())
+    # Keras 3 layers reshape their (now constant) biases at run time; cv2.dnn
+    # cannot import a Reshape of a constant, so fold those away with grappler
+    meta = tf.compat.v1.train.export_meta_graph(graph_def=frozen.graph.as_graph_def(), graph=frozen.graph)
+    fetch = meta_graph_pb2.CollectionDef()
+    fetch.node_list.value.extend(t.name for t in frozen.outputs)
+    meta.collection_def["train_op"].CopyFrom(fetch)
+    config = config_pb2.ConfigProto()
+    config.graph_options.rewrite_options.optimizers.extend(["constfold", "dependency", "arithmetic"])
+    config.graph_options.rewrite_options.min_graph_nodes = -1
+    data = tf_optimizer.OptimizeGraph(config, meta).SerializeToString()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return len(data)
+
+
+def _measure(backend, paths, crops_by_image, repeat):
+    # Runs in a fresh process: startup covers the imports as well as the model
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    os.environ["FACE_CLASSIFIER"] = face_pipeline.CLASSIFIER = backend
+    detector = detectors.get("face")
+    cv2 = detectors.get("cv2")
+    startup_seconds = time.perf_counter() - start
+    results = []
+    for path, (name, crops) in zip(paths, crops_by_image):
+        image = cv2.imread(path)
+        classify_times, detect_times = [], []
+        for _ in range(repeat):
+            t = time.perf_counter()
+            scores = detector._classify_emotions(crops)
+            classify_times.append(time.perf_counter() - t)
+            t = time.perf_counter()
+            detector.detect_emotions(image)
+            detect_times.append(time.perf_counter() - t)
+        results.append({"image": name, "classify_ms": 1000 * min(classify_times),
+                        "detect_emotions_ms": 1000 * min(detect_times), "scores": np.asarray(scores).tolist()})
+    rss_after = _rss_mb()
+    return {"startup_seconds": startup_seconds, "rss_mb": rss_after,
+            "rss_growth_mb": rss_after - rss_before if rss_after is not None else None,
+            "tensorflow_imported": "tensorflow" in sys.modules, "images": results}
+
+
+def compare(paths, repeat=10):
+    """Startup, memory, per-image latency and label agreement of FER and the cv2.dnn path."""
+    kept, crops_by_image, faces = [], [], {}
+    for path in paths:
+        crops, found = image_crops(path)
+        if crops is not None and len(crops):
+            kept.append(path)
+            crops_by_image.append((os.path.basename(path), crops))
+            faces[os.path.basename(path)] = found
+    ctx = multiprocessing.get_context("spawn")
+    runs = {}
+    for backend in ("keras", "dnn"):
+        with ctx.Pool(1) as pool:
+            runs[backend] = pool.apply(_measure, (backend, kept, crops_by_image, repeat))
+
+    rows, agree, total = [], 0, 0
+    for k, d in zip(runs["keras"]["images"], runs["dnn"]["images"]):
+        k_scores, d_scores = np.asarray(k["scores"]), np.asarray(d["scores"])
+        k_labels, d_labels = k_scores.argmax(axis=1), d_scores.argmax(axis=1)
+        agree += int((k_labels == d_labels).sum())
+        total += len(k_labels)
+        rows.append({
+            "image": k["image"],
+            "face": faces[k["image"]],
+            "crops": len(k_labels),
+            "keras_classify_ms": k["classify_ms"],
+            "dnn_classify_ms": d["classify_ms"],
+            "keras_detect_emotions_ms": k["detect_emotions_ms"],
+            "dnn_detect_emotions_ms": d["detect_emotions_ms"],
+            "max_abs_diff": float(np.abs(k_scores - d_scores).max()),
+        })
+    summary = {name: {key: value for key, value in run.items() if key != "images"} for name, run in runs.items()}
+    summary["dnn"]["model_bytes"] = os.path.getsize(MODEL_PATH)
+    summary["label_agreement"] = agree / total if total else None
+    return {"images": rows, "summary": summary}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export and compare the cv2.dnn emotion model.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("export", help="freeze FER's Keras model for cv2.dnn (needs TensorFlow)")
+    p.add_argument("-o", "--output", default=MODEL_PATH)
+    p = sub.add_parser("compare", help="compare FER and cv2.dnn on photos")
+    p.add_argument("images", nargs="*", help=f"photos (default: {IMAGES})")
+    p.add_argument("--repeat", type=int, default=10)
+    p.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        print(f"Wrote {args.output} ({export(args.output) / 1024:.0f} KiB)")
+        sys.exit(0)
+
+    report = compare(args.images or sorted(glob.glob(IMAGES)), args.repeat)
+    print(f"{'image':<24}{'crops':>6}{'classify ms keras/dnn':>24}{'detect_emotions ms keras/dnn':>31}{'max diff':>10}")
+    for row in report["images"]:
+        print(f"{row['image'][:23]:<24}{row['crops']:>6}"
+              f"{row['keras_classify_ms']:>15.2f} /{row['dnn_classify_ms']:>7.2f}"
+              f"{row['keras_detect_emotions_ms']:>22.2f} /{row['dnn_detect_emotions_ms']:>7.2f}"
+              f"{row['max_abs_diff']:>10.1e}")
+    for name in ("keras", "dnn"):
+        s = report["summary"][name]
+        print(f"{name}: startup {s['startup_seconds']:.2f}s, RSS {s['rss_mb'] or 0:.0f} MB "
+              f"(+{s['rss_growth_mb'] or 0:.0f} MB), TensorFlow imported: {s['tensorflow_imported']}")
+    print(f"dnn model {report['summary']['dnn']['model_bytes'] / 1024:.0f} KiB, "
+          f"label agreement {report['summary']['label_agreement']:.1%}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,146 @@
+import os
+
+import numpy as np
+
+import detectors
+
+# The FER pipeline split into its stages, so callers can detect faces,
+# preprocess crops and classify them separately (batching, tracking, caching).
+# Crops are prepared exactly as FER.detect_emotions prepares them.
+
+LABELS = ("angry", "disgust", "fear", "happy", "sad", "surprise", "neutral")
+PADDING = 40           # fer.fer.PADDING
+OFFSETS = (10, 10)     # FER default offsets around a face box
+TARGET_SIZE = (64, 64)  # input size of FER's emotion model
+CLASSIFIER = os.getenv("FACE_CLASSIFIER", "keras")  # or "tflite" / "dnn", see face_tflite.py and face_dnn.py
+DETECTOR = os.getenv("FACE_DETECTOR", "haar")  # or "haar_scaled" / "ssd", see face_detect.py
+
+
+def find_faces(image, detector=None, bgr=True):
+    """Face boxes (x, y, w, h) in an image, in its own coordinates.
+
+    FACE_DETECTOR=haar uses the detector's find_faces (FER's full-resolution
+    Haar cascade); other settings use the face_detect.py stage instead.
+    """
+    if DETECTOR != "haar":
+        detector = detectors.get("face_detector")
+    else:
+        detector = detector or detectors.get("face")
+    return [tuple(int(v) for v in box) for box in detector.find_faces(image, bgr=bgr)]
+
+
+def pad_gray(image):
+    """Grayscale copy of a BGR image padded like FER.pad."""
+    cv2 = detectors.get("cv2")
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    mean = cv2.mean(gray[-2:, :])[0]
+    return cv2.copyMakeBorder(gray, PADDING, PADDING, PADDING, PADDING, cv2.BORDER_CONSTANT, value=[mean, mean, mean])
+
+
+def face_crops(image, boxes, padded=None):
+    """Preprocessed (n, 64, 64) float32 crops for the given boxes.
+
+    Returns (crops, kept boxes); boxes whose crop is empty are dropped,
+    as in FER.detect_emotions.
+    """
+    cv2 = detectors.get("cv2")
+    padded = pad_gray(image) if padded is None else padded
+    crops, kept = [], []
+    for box in boxes:
+        x, y, w, h = square_box(box)
+        x1 = max(0, x - OFFSETS[0] + PADDING)
+        y1 = max(0, y - OFFSETS[1] + PADDING)
+        x2 = x + w + OFFSETS[0] + PADDING
+        y2 = y + h + OFFSETS[1] + PADDING
+        crop = padded[y1:y2, x1:x2]
+        if crop.size == 0:
+            continue
+        crops.append(cv2.resize(crop, TARGET_SIZE))
+        kept.append(box)
+    if not crops:
+        return np.empty((0,) + TARGET_SIZE, dtype=np.float32), kept
+    crops = np.asarray(crops, dtype=np.float32)
+    # FER's preprocess_input(v2=True): scale to [-1, 1]
+    crops /= 255.0
+    crops -= 0.5
+    crops *= 2.0
+    return crops, kept
+
+
+def square_box(box):
+    """Grow the shorter side of a box so it is square (FER.tosquare)."""
+    x, y, w, h = box
+    if h > w:
+        diff = h - w
+        x -= diff // 2
+        w += diff
+    elif w > h:
+        diff = w - h
+        y -= diff // 2
+        h += diff
+    return x, y, w, h
+
+
+def classify(crops, detector=None):
+    """Emotion probabilities, shape (n, 7), for preprocessed crops."""
+    if len(crops) == 0:
+        return np.empty((0, len(LABELS)), dtype=np.float32)
+    if CLASSIFIER == "tflite":
+        return detectors.get("face_tflite").classify(crops)
+    if CLASSIFIER == "dnn":
+        return detectors.get("face_dnn").classify(crops)
+    return classify_keras(crops, detector)
+
+
+def classify_keras(crops, detector=None):
+    """classify() through FER's Keras model, whatever FACE_CLASSIFIER says."""
+    detector = detector or detectors.get("face")
+    return np.asarray(detector._classify_emotions(crops))
+
+
+def label_scores(scores):
+    """Round one row of probabilities into FER's {label: score} dict."""
+    return {label: round(float(score), 2) for label, score in zip(LABELS, scores)}
+
+
+def detect_faces(image, detector=None, classify_fn=None):
+    """Every face in a BGR image with its emotions, from one batched classifier call.
+
+    Returns FER.detect_emotions-style dicts plus "top_emotion". classify_fn
+    replaces classify(), e.g. with a MicroBatcher's.
+    """
+    crops, boxes = face_crops(image, find_faces(image, detector))
+    scores = classify_fn(crops) if classify_fn else classify(crops, detector)
+    faces = []
+    for box, row in zip(boxes, scores):
+        emotions = label_scores(row)
+        faces.append({"box": list(box), "emotions": emotions, "top_emotion": max(emotions, key=emotions.get)})
+    return faces
+
+
+def top_emotion(image, detector=None):
+    """(emotion, score) of the first face, like FER.top_emotion, or (None, None).
+
+    Faces come from find_faces, so FACE_DETECTOR applies.
+    """
+    faces = detect_faces(image, detector)
+    if not faces:
+        return None, None
+    emotion = faces[0]["top_emotion"]
+    return emotion, faces[0]["emotions"][emotion]
+
+
+def group_mood(faces):
+    """Mood of a group: face emotion scores averaged, weighted by face area x confidence.
+
+    Confidence is a face's top score, so large, clearly read faces count
+    most. Returns None when there are no faces.
+    """
+    if not faces:
+        return None
+    scores = np.array([[face["emotions"][label] for label in LABELS] for face in faces], dtype=np.float64)
+    areas = np.array([face["box"][2] * face["box"][3] for face in faces], dtype=np.float64)
+    weights = areas * scores.max(axis=1)
+    mood = weights @ scores / max(weights.sum(), 1e-12)
+    emotions = label_scores(mood)
+    return {"mood": LABELS[int(mood.argmax())], "emotions": emotions, "faces": len(faces)}
@@ -0,0 +1,241 @@
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+import detectors
+import face_detect
+import face_pipeline
+
+# Int8-quantized TFLite copy of FER's emotion CNN.
+# `python face_tflite.py export` converts the Keras model FER loads, using
+# face crops from calibration photos as the representative dataset, and
+# `python face_tflite.py compare` reports latency, memory and label agreement
+# against the Keras path. FACE_CLASSIFIER=tflite makes face_pipeline.classify
+# use it; tflite_runtime or ai_edge_litert is used when installed so the
+# worker never imports full TensorFlow.
+
+MODEL_PATH = os.getenv("FACE_TFLITE_MODEL", os.path.join(os.path.dirname(__file__), "models", "fer_emotion_int8.tflite"))
+IMAGES = os.path.join(os.path.dirname(__file__), "static", "images", "*")
+
+
+def _interpreter_class():
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            return tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteClassifier:
+    """Runs the int8 model on preprocessed (n, 64, 64) crops, one invoke per batch."""
+
+    def __init__(self, path=MODEL_PATH, num_threads=None):
+        self.interpreter = _interpreter_class()(model_path=path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.in_scale, self.in_zero = self.input["quantization"]
+        self.out_scale, self.out_zero = self.output["quantization"]
+        self._batch = 1
+        self._lock = threading.Lock()  # an interpreter is not thread-safe
+
+    def classify(self, crops):
+        """Emotion probabilities, shape (n, 7), like face_pipeline.classify."""
+        quantized = np.clip(np.round(crops / self.in_scale + self.in_zero), -128, 127).astype(np.int8)
+        if not len(crops):
+            return np.empty((0, len(face_pipeline.LABELS)), dtype=np.float32)
+        with self._lock:
+            if self._batch != len(crops):
+                # resize to the crop count so the whole batch runs in one invoke
+                self.interpreter.resize_tensor_input(self.input["index"], [len(crops), 64, 64, 1])
+                self.interpreter.allocate_tensors()
+                self._batch = len(crops)
+            self.interpreter.set_tensor(self.input["index"], quantized[..., None])
+            self.interpreter.invoke()
+            scores = self.interpreter.get_tensor(self.output["index"]).astype(np.float32)
+        scores -= self.out_zero
+        scores *= self.out_scale
+        return scores
+
+
+def calibration_crops(paths, limit=200, seed=0):
+    """Face crops from the photos, topped up with random square windows."""
+    cv2 = detectors.get("cv2")
+    rng = np.random.default_rng(seed)
+    crops = []
+    images = [image for image in (cv2.imread(p) for p in paths) if image is not None]
+    for image in images:
+        boxes = face_pipeline.find_faces(image)
+        crops.extend(face_pipeline.face_crops(image, boxes)[0])
+    while images and len(crops) < limit:
+        image = images[rng.integers(len(images))]
+        height, width = image.shape[:2]
+        size = int(rng.integers(48, min(height, width)))
+        x, y = int(rng.integers(width - size + 1)), int(rng.integers(height - size + 1))
+        crops.extend(face_pipeline.face_crops(image, [(x, y, size, size)])[0])
+    return np.asarray(crops[:limit], dtype=np.float32)
+
+
+def keras_model():
+    """FER's Keras emotion model, loaded from fer's package data.
+
+    Read from the file rather than taken from detectors.get("face"), which
+    is not a FER object under FACE_CLASSIFIER=dnn.
+    """
+    import tensorflow as tf
+
+    path = os.path.join(os.path.dirname(face_detect.cascade_path()), "emotion_model.hdf5")
+    return tf.keras.models.load_model(path, compile=False)
+
+
+def export(path=MODEL_PATH, calibration=IMAGES):
+    """Convert FER's Keras emotion model to a full-integer TFLite model at path."""
+    import tensorflow as tf
+
+    model = keras_model()
+    crops = calibration_crops(sorted(glob.glob(calibration)))
+
+    def representative_dataset():
+        for crop in crops:
+            yield [crop[None, :, :, None]]
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = tf.int8
+    converter.inference_output_type = tf.int8
+    data = converter.convert()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return len(data), len(crops)
+
+
+def image_crops(path):
+    """(crops, face found): every face in a photo, or its centre square if none."""
+    cv2 = detectors.get("cv2")
+    image = cv2.imread(path)
+    if image is None:
+        return None, False
+    boxes = face_pipeline.find_faces(image)
+    found = bool(boxes)
+    if not found:
+        height, width = image.shape[:2]
+        size = min(height, width)
+        boxes = [((width - size) // 2, (height - size) // 2, size, size)]
+    return face_pipeline.face_crops(image, boxes)[0], found
+
+
+def _rss_mb():
+    # Current RSS; ru_maxrss survives exec on Linux, so a spawned child would
+    # report its parent's peak
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return detectors._peak_rss_mb()
+
+
+def _measure(backend, crops_by_image, repeat):
+    # Runs in a fresh process so each backend's imports and memory are its own
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    classify = TFLiteClassifier().classify if backend == "tflite" else face_pipeline.classify_keras
+    classify(crops_by_image[0][1])  # warm-up
+    load_seconds = time.perf_counter() - start
+    results = []
+    for name, crops in crops_by_image:
+        times = []
+        for _ in range(repeat):
+            t = time.perf_counter()
+            scores = classify(crops)
+            times.append(time.perf_counter() - t)
+        results.append({"image": name, "ms": 1000 * min(times), "scores": np.asarray(scores).tolist()})
+    rss_after = _rss_mb()
+    return {"load_seconds": load_seconds, "rss_mb": rss_after,
+            "rss_growth_mb": rss_after - rss_before if rss_after is not None else None, "images": results}
+
+
+def compare(paths, repeat=20):
+    """Per-image latency, memory and label agreement of the Keras and TFLite paths."""
+    crops_by_image, faces = [], {}
+    for path in paths:
+        crops, found = image_crops(path)
+        if crops is not None and len(crops):
+            crops_by_image.append((os.path.basename(path), crops))
+            faces[os.path.basename(path)] = found
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(1) as pool:
+        keras = pool.apply(_measure, ("keras", crops_by_image, repeat))
+    with ctx.Pool(1) as pool:
+        tflite = pool.apply(_measure, ("tflite", crops_by_image, repeat))
+
+    rows, agree, total = [], 0, 0
+    for k, t in zip(keras["images"], tflite["images"]):
+        k_scores, t_scores = np.asarray(k["scores"]), np.asarray(t["scores"])
+        k_labels, t_labels = k_scores.argmax(axis=1), t_scores.argmax(axis=1)
+        agree += int((k_labels == t_labels).sum())
+        total += len(k_labels)
+        rows.append({
+            "image": k["image"],
+            "face": faces[k["image"]],
+            "crops": len(k_labels),
+            "keras_ms": k["ms"],
+            "tflite_ms": t["ms"],
+            "keras_labels": [face_pipeline.LABELS[i] for i in k_labels],
+            "tflite_labels": [face_pipeline.LABELS[i] for i in t_labels],
+            "max_abs_diff": float(np.abs(k_scores - t_scores).max()),
+        })
+    summary = {}
+    for name, run in (("keras", keras), ("tflite", tflite)):
+        summary[name] = {key: run[key] for key in ("load_seconds", "rss_mb", "rss_growth_mb")}
+    summary["tflite"]["model_bytes"] = os.path.getsize(MODEL_PATH)
+    summary["label_agreement"] = agree / total if total else None
+    return {"images": rows, "summary": summary}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export and compare the int8 TFLite emotion model.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("export", help="convert FER's Keras model to int8 TFLite")
+    p.add_argument("-o", "--output", default=MODEL_PATH)
+    p.add_argument("--calibration", default=IMAGES, help="glob of photos used for calibration crops")
+    p = sub.add_parser("compare", help="compare Keras and TFLite on photos")
+    p.add_argument("images", nargs="*", help=f"photos (default: {IMAGES})")
+    p.add_argument("--repeat", type=int, default=20)
+    p.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        size, samples = export(args.output, args.calibration)
+        print(f"Wrote {args.output} ({size / 1024:.0f} KiB, calibrated on {samples} crops)")
+        sys.exit(0)
+
+    report = compare(args.images or sorted(glob.glob(IMAGES)), args.repeat)
+    print(f"{'image':<24}{'crops':>6}{'keras ms':>10}{'tflite ms':>11}{'max diff':>10}  labels")
+    for row in report["images"]:
+        same = "same" if row["keras_labels"] == row["tflite_labels"] else \
+            f"{','.join(row['keras_labels'])} -> {','.join(row['tflite_labels'])}"
+        print(f"{row['image'][:23]:<24}{row['crops']:>6}{row['keras_ms']:>10.2f}{row['tflite_ms']:>11.2f}"
+              f"{row['max_abs_diff']:>10.3f}  {same}")
+    for name in ("keras", "tflite"):
+        s = report["summary"][name]
+        print(f"{name}: load {s['load_seconds']:.2f}s, RSS {s['rss_mb'] or 0:.0f} MB "
+              f"(+{s['rss_growth_mb'] or 0:.0f} MB)")
+    print(f"tflite model {report['summary']['tflite']['model_bytes'] / 1024:.0f} KiB, "
+          f"label agreement {report['summary']['label_agreement']:.1%}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
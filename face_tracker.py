@@ -0,0 +1,80 @@
+import detectors
+import face_pipeline
+
+
+class FaceTracker:
+    """Follows one face across video frames so most frames skip face detection.
+
+    The face detector runs on the first frame, every `redetect_every` frames
+    and whenever tracking confidence drops below `min_confidence`. In between,
+    the face is found by template matching the last detected face inside a
+    window around its previous position, and only that crop is classified.
+    Template matching needs nothing beyond core OpenCV, unlike the KCF/CSRT
+    trackers that live in opencv-contrib.
+    """
+
+    def __init__(self, detector=None, redetect_every=10, min_confidence=0.6, search_margin=0.5):
+        self.detector = detector or detectors.get("face")
+        self.redetect_every = redetect_every
+        self.min_confidence = min_confidence
+        self.search_margin = search_margin
+        self.box = None
+        self.template = None
+        self.since_detect = 0
+        self.detections = 0
+        self.tracked = 0
+
+    def update(self, frame):
+        """Locate the face in a BGR frame; returns (box or None, gray frame, tracked)."""
+        cv2 = detectors.get("cv2")
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if self.box is not None and self.since_detect < self.redetect_every:
+            box = self._track(gray)
+            if box is not None:
+                self.box = box
+                self.since_detect += 1
+                self.tracked += 1
+                return box, gray, True
+        self._detect(gray)
+        return self.box, gray, False
+
+    def process(self, frame):
+        """Locate and classify the face; returns a result dict or None without a face."""
+        box, gray, tracked = self.update(frame)
+        if box is None:
+            return None
+        crops, kept = face_pipeline.face_crops(gray, [box], face_pipeline.pad_gray(gray))
+        if not kept:
+            return None
+        emotions = face_pipeline.label_scores(face_pipeline.classify(crops, self.detector)[0])
+        return {"box": list(box), "emotions": emotions, "top_emotion": max(emotions, key=emotions.get), "tracked": tracked}
+
+    def stats(self):
+        frames = self.detections + self.tracked
+        return {"detections": self.detections, "tracked": self.tracked, "tracked_ratio": self.tracked / frames if frames else 0.0}
+
+    def _detect(self, gray):
+        self.detections += 1
+        self.since_detect = 0
+        faces = face_pipeline.find_faces(gray, self.detector, bgr=False)
+        if len(faces) == 0:
+            self.box = self.template = None
+            return
+        x, y, w, h = (int(v) for v in max(faces, key=lambda f: f[2] * f[3]))
+        self.box = (x, y, w, h)
+        self.template = gray[y:y + h, x:x + w].copy()
+
+    def _track(self, gray):
+        cv2 = detectors.get("cv2")
+        x, y, w, h = self.box
+        mx, my = int(w * self.search_margin), int(h * self.search_margin)
+        x1, y1 = max(0, x - mx), max(0, y - my)
+        x2, y2 = min(gray.shape[1], x + w + mx), min(gray.shape[0], y + h + my)
+        window = gray[y1:y2, x1:x2]
+        if window.shape[0] < h or window.shape[1] < w:
+            return None
+        result = cv2.matchTemplate(window, self.template, cv2.TM_CCOEFF_NORMED)
+        _, confidence, _, (dx, dy) = cv2.minMaxLoc(result)
+        if confidence < self.min_confidence:
+            return None
+        return x1 + dx, y1 + dy, w, h
@@ -0,0 +1,69 @@
+import time
+
+import detectors
+import face_pipeline
+
+# Multi-frame emotion voting for webcam capture.
+# Instead of trusting the first frame with a face, each frame is downscaled
+# and classified, and the top emotion of its largest face adds its
+# confidence to a vote. Capture stops early once the leading emotion's share
+# of the votes beats the runner-up by `margin`, or when the frame window or
+# the time budget runs out.
+
+
+def vote_emotion(frames, detector=None, scale=0.5, max_frames=15, min_frames=3, margin=0.5, deadline=3.0):
+    """Confidence-weighted vote over frames.
+
+    Returns a dict with the winning emotion (or None), its share of the
+    votes, the vote totals, frames processed, frames with a face, seconds
+    spent and why capture stopped ("margin", "deadline", "window" or "end").
+    """
+    cv2 = detectors.get("cv2")
+    detector = detector or detectors.get("face")
+    start = time.monotonic()
+    votes = {}
+    frames_seen = 0
+    frames_with_face = 0
+    stopped = "end"
+
+    for frame in frames:
+        frames_seen += 1
+        if scale != 1.0:
+            frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        faces = face_pipeline.detect_faces(frame, detector)
+        if faces:
+            frames_with_face += 1
+            face = max(faces, key=lambda f: f["box"][2] * f["box"][3])
+            emotion = max(face["emotions"], key=face["emotions"].get)
+            votes[emotion] = votes.get(emotion, 0.0) + face["emotions"][emotion]
+
+        if frames_with_face >= min_frames and _lead(votes) >= margin:
+            stopped = "margin"
+            break
+        if time.monotonic() - start >= deadline:
+            stopped = "deadline"
+            break
+        if frames_seen >= max_frames:
+            stopped = "window"
+            break
+
+    total = sum(votes.values())
+    emotion = max(votes, key=votes.get) if votes else None
+    return {
+        "emotion": emotion,
+        "confidence": votes[emotion] / total if emotion else 0.0,
+        "votes": votes,
+        "frames": frames_seen,
+        "frames_with_face": frames_with_face,
+        "seconds": time.monotonic() - start,
+        "stopped": stopped,
+    }
+
+
+def _lead(votes):
+    """Margin of the leading emotion over the runner-up, as a share of all votes."""
+    total = sum(votes.values())
+    if not total:
+        return 0.0
+    ranked = sorted(votes.values(), reverse=True) + [0.0]
+    return (ranked[0] - ranked[1]) / total
@@ -1,37 +1,47 @@
 import cv2
-from fer import FER
-
-def detect_faces_and_emotions():
-    # Initialize FER emotion detector without MTCNN
-    detector = FER(mtcnn=False)
-
-    # Access the webcam
-    cap = cv2.VideoCapture(0)
-
-    if not cap.isOpened():
+import detectors
+import face_pipeline
+from capture_service import CaptureService
+from emotion_cache import FrameCache
+from face_tracker import FaceTracker
+
+def detect_faces_and_emotions(track=True, redetect_every=10, headless=None):
+    # Shared FER emotion detector (without MTCNN), loaded once per process
+    detector = detectors.get("face")
+
+    # Follow the face between detections and classify only its crop
+    tracker = FaceTracker(detector, redetect_every=redetect_every) if track else None
+    # Untracked, near-identical frames within a second reuse the previous
+    # result. The tracker sees every frame instead: skipping some would leave
+    # its track ages and positions stale
+    frame_cache = FrameCache(maxsize=64, max_distance=4, ttl=1.0)
+
+    # Capture on a background thread; inference always takes the newest frame
+    capture = CaptureService(0, headless=headless)
+    if not capture.start():
         print("Error: Could not access the webcam.")
         return
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("Error: Could not read a frame from the webcam.")
-            break
-
-        # Detect emotions using FER
-        emotion, score = detector.top_emotion(frame)
-        if emotion:
-            print(f"Detected Emotion: {emotion} (Score: {score:.2f})")
-
-        # Display the video feed
-        cv2.imshow("Facial Emotion Detection", frame)
-
-        # Press 'q' to quit
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-
-    cap.release()
-    cv2.destroyAllWindows()
+    with capture:
+        for frame in capture.frames():
+            # Detect emotions using FER
+            if tracker:
+                result = tracker.process(frame)
+                if result:
+                    emotion = result["top_emotion"]
+                    print(f"Detected Emotion: {emotion} (Score: {result['emotions'][emotion]:.2f})")
+                    x, y, w, h = result["box"]
+                    cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+            else:
+                emotion, score = frame_cache.lookup(frame, lambda: face_pipeline.top_emotion(frame, detector))
+                if emotion:
+                    print(f"Detected Emotion: {emotion} (Score: {score:.2f})")
+
+            # Display the video feed; press 'q' to quit (no window when headless)
+            if not capture.show(frame):
+                break
+        print(f"Capture: {capture.stats()}")
+        print(f"Frame cache: {frame_cache.stats()}")
 
 if __name__ == "__main__":
     detect_faces_and_emotions()
@@ -0,0 +1,301 @@
+import argparse
+import logging
+import multiprocessing
+from multiprocessing import shared_memory
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+import detectors
+import face_pipeline
+
+# Face inference on a pool of processes, fed through shared memory.
+# Frames live in fixed-size slots of one shared_memory block; the capture
+# side decodes straight into a free slot (cap.read(out)), and only the slot
+# index travels through the task queue. Each worker process maps the same
+# block, runs FER on its slot in place and returns the small result dict, at
+# which point the slot is free again. When every slot is busy the newest
+# frame is dropped rather than queued, so latency stays bounded.
+
+log = logging.getLogger("frame_pool")
+
+
+def _attach(name):
+    """Map the pool's block in a worker; the parent owns (and unlinks) it."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        # Spawned workers share the parent's resource tracker, where a
+        # second registration of the same name is a no-op
+        return shared_memory.SharedMemory(name=name)
+
+
+def _worker(name, shape, slots, intra_op, tasks, results):
+    shm = _attach(name)
+    frames = np.ndarray((slots,) + shape, dtype=np.uint8, buffer=shm.buf)
+    try:
+        try:
+            detectors.configure_tensorflow(intra_op, 1)
+            detector = detectors.get("face")
+        except Exception as e:
+            results.put(("ready", os.getpid(), f"{type(e).__name__}: {e}"))
+            return
+        results.put(("ready", os.getpid(), None))
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            seq, slot = task
+            start = time.perf_counter()
+            frame = frames[slot]
+            # Every task must answer, or its slot is never freed and results() waits forever
+            try:
+                faces = face_pipeline.detect_faces(frame, detector)
+                error = None
+            except Exception as e:
+                faces, error = None, f"{type(e).__name__}: {e}"
+            results.put((seq, slot, faces, time.perf_counter() - start, error))
+    finally:
+        del frames
+        shm.close()
+
+
+class FramePool:
+    """Fixed-shape frame slots in shared memory, served by FER worker processes.
+
+    acquire() hands out a free slot index (write into frames[slot]), send()
+    queues it for inference and results()/poll() return (seq, faces,
+    seconds) as workers finish, in completion order; faces is None for a
+    frame whose inference failed (logged and counted in stats()). A
+    collector thread puts each slot back on the free list as soon as its
+    result arrives. If a worker process dies, every frame still in flight
+    is answered as failed and send() refuses new ones.
+    """
+
+    def __init__(self, shape, workers=None, slots=None, intra_op=None):
+        self.shape = tuple(shape)
+        self.workers = workers or os.cpu_count() or 1
+        self.slots = slots or 2 * self.workers
+        intra_op = intra_op or max(1, (os.cpu_count() or 1) // self.workers)
+        nbytes = int(np.prod(self.shape)) * self.slots
+        self._shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        self.frames = np.ndarray((self.slots,) + self.shape, dtype=np.uint8, buffer=self._shm.buf)
+        self._free = queue.Queue()
+        for slot in range(self.slots):
+            self._free.put(slot)
+        ctx = multiprocessing.get_context("spawn")
+        self._tasks, self._results = ctx.Queue(), ctx.Queue()
+        self._procs = [ctx.Process(target=_worker, daemon=True,
+                                   args=(self._shm.name, self.shape, self.slots, intra_op, self._tasks, self._results))
+                       for _ in range(self.workers)]
+        try:
+            for p in self._procs:
+                p.start()
+            for _ in self._procs:
+                _, pid, error = self._results.get(timeout=300)  # once the model is loaded
+                if error:
+                    raise RuntimeError(f"Frame pool worker {pid} failed to start: {error}")
+        except BaseException:
+            # Nothing else will free the block: close() is never reached
+            for p in self._procs:
+                if p.is_alive():
+                    p.terminate()
+                p.join(timeout=5)
+            del self.frames
+            self._shm.close()
+            self._shm.unlink()
+            raise
+        self._seq = 0
+        self._pending = {}   # seq -> slot of every frame sent and not yet answered
+        self._closing = False
+        self.broken = False
+        self._lock = threading.Lock()
+        self._done = queue.Queue()
+        self._collector = threading.Thread(target=self._collect, name="frame-pool", daemon=True)
+        self._collector.start()
+        self.sent = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def acquire(self, block=False, timeout=None):
+        """A free slot index, or None (counted as a dropped frame) if all are busy."""
+        try:
+            return self._free.get(block, timeout)
+        except queue.Empty:
+            with self._lock:
+                self.dropped += 1
+            return None
+
+    def send(self, slot):
+        """Queue a filled slot for inference; returns its sequence number."""
+        with self._lock:
+            if self.broken:
+                raise RuntimeError("A frame pool worker died; close the pool and start a new one")
+            self._seq += 1
+            self._pending[self._seq] = slot
+            self.sent += 1
+            seq = self._seq
+        self._tasks.put((seq, slot))
+        return seq
+
+    def release(self, slot):
+        """Return an acquired slot that will not be sent."""
+        self._free.put(slot)
+
+    def submit(self, frame, block=False):
+        """Copy a frame into a free slot and queue it; None if it was dropped."""
+        slot = self.acquire(block)
+        if slot is None:
+            return None
+        self.frames[slot] = frame
+        return self.send(slot)
+
+    def results(self, timeout=None):
+        """Yield (seq, faces, seconds) for finished frames until none are in flight."""
+        while True:
+            with self._lock:
+                if not self._pending and self._done.empty():
+                    return
+            yield self._done.get(timeout=timeout)
+
+    def poll(self):
+        """The next finished (seq, faces, seconds) without waiting, or None."""
+        try:
+            return self._done.get_nowait()
+        except queue.Empty:
+            return None
+
+    def _collect(self):
+        while True:
+            try:
+                message = self._results.get(timeout=1.0)
+            except queue.Empty:
+                self._check_workers()
+                continue
+            if message is None:
+                return
+            seq, slot, faces, seconds, error = message
+            if error:
+                log.error("Frame %d failed: %s", seq, error)
+            self._finish(seq, faces, seconds, error)
+
+    def _finish(self, seq, faces, seconds, error):
+        with self._lock:
+            slot = self._pending.get(seq)
+            if slot is None:
+                return  # already failed when a worker died
+            self.errors += bool(error)
+        self._free.put(slot)
+        # Queue the result before it stops counting as in flight, so
+        # results() cannot miss it
+        self._done.put((seq, faces, seconds))
+        with self._lock:
+            del self._pending[seq]
+
+    def _check_workers(self):
+        # A killed worker (OOM, a crash in cv2 or TensorFlow) never answers the
+        # task it held, and which one that was is unknown: fail them all
+        dead = [p for p in self._procs if not p.is_alive()]
+        if not dead or self._closing:
+            return
+        with self._lock:
+            newly_broken, self.broken = not self.broken, True
+            pending = list(self._pending)
+        if newly_broken:
+            log.error("Frame pool worker(s) %s died (exit codes %s); failing %d frames in flight",
+                      [p.pid for p in dead], [p.exitcode for p in dead], len(pending))
+        for seq in pending:
+            self._finish(seq, None, 0.0, "worker died")
+
+    def stats(self):
+        with self._lock:
+            return {"workers": self.workers, "slots": self.slots, "sent": self.sent,
+                    "dropped": self.dropped, "errors": self.errors, "in_flight": len(self._pending),
+                    "broken": self.broken}
+
+    def close(self):
+        self._closing = True
+        for _ in self._procs:
+            self._tasks.put(None)
+        for p in self._procs:
+            p.join(timeout=30)
+        self._results.put(None)
+        self._collector.join()
+        del self.frames
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def run_capture(cap, pool, on_result, max_frames=None, block=False):
+    """Decode frames from an opened cv2.VideoCapture straight into pool slots.
+
+    Frames read while every slot is busy are read into a scratch buffer and
+    dropped, unless block is set (for files, where every frame should count).
+    on_result(seq, faces, seconds) is called as results arrive.
+    """
+    scratch = np.empty(pool.shape, dtype=np.uint8)
+    frames = 0
+    while max_frames is None or frames < max_frames:
+        slot = pool.acquire(block)
+        out = scratch if slot is None else pool.frames[slot]
+        ret, frame = cap.read(out)
+        if ret and frame.ctypes.data != out.ctypes.data:
+            out[...] = frame  # backend returned its own buffer
+        if not ret:
+            if slot is not None:
+                pool.release(slot)
+            break
+        frames += 1
+        if slot is not None:
+            pool.send(slot)
+        result = pool.poll()
+        while result is not None:
+            on_result(*result)
+            result = pool.poll()
+    for result in pool.results():
+        on_result(*result)
+    return frames
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run face emotion on a process pool fed through shared memory.")
+    parser.add_argument("source", nargs="?", default="0", help="camera index or video file")
+    parser.add_argument("-j", "--workers", type=int, default=None)
+    parser.add_argument("--slots", type=int, default=None)
+    parser.add_argument("--frames", type=int, default=None, help="stop after this many frames")
+    parser.add_argument("--no-drop", action="store_true", help="wait for a free slot instead of dropping frames")
+    args = parser.parse_args()
+
+    cv2 = detectors.get("cv2")
+    cap = cv2.VideoCapture(int(args.source) if args.source.isdigit() else args.source)
+    ret, first = cap.read()
+    if not ret:
+        raise SystemExit("Error: Could not read from " + args.source)
+
+    latencies = []
+
+    def report(seq, faces, seconds):
+        latencies.append(seconds)
+        if faces:
+            emotions = max(faces, key=lambda f: f["box"][2] * f["box"][3])["emotions"]
+            emotion = max(emotions, key=emotions.get)
+            print(f"Frame {seq}: {emotion} (Score: {emotions[emotion]:.2f})")
+
+    with FramePool(first.shape, args.workers, args.slots) as pool:
+        start = time.perf_counter()
+        frames = run_capture(cap, pool, report, args.frames, args.no_drop)
+        elapsed = time.perf_counter() - start
+        stats = pool.stats()
+    cap.release()
+    print(f"{frames} frames in {elapsed:.2f}s: {stats['sent'] / elapsed:.1f} inferred/s, "
+          f"{stats['dropped']} dropped, mean inference {1000 * np.mean(latencies or [0]):.0f} ms, "
+          f"{stats['workers']} workers")
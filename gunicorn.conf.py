@@ -0,0 +1,67 @@
+import itertools
+import os
+import sys
+
+# gunicorn -c gunicorn.conf.py new_app:app
+#
+# The app is imported once in the master before workers fork, so detector
+# backends listed in EAGER_DETECTORS are loaded a single time and shared
+# copy-on-write by every worker. Keep TensorFlow out of the master: its
+# thread pools do not survive fork, and a worker forked after the master ran
+# a model deadlocks on its first op with more than one intra-op thread. The
+# warmed FER model is loaded in each worker instead, before it takes
+# requests (WORKER_EAGER_DETECTORS).
+os.environ.setdefault("EAGER_DETECTORS", "text")
+worker_eager_detectors = os.getenv("WORKER_EAGER_DETECTORS", "face")
+
+preload_app = True
+bind = os.getenv("BIND", "127.0.0.1:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+# Tells the app how many processes share the load: per-process session state
+# (chat mood) switches to a shared SQLite store when there is more than one.
+# Live webcam sessions cannot be shared that way: with more than one worker
+# the /api/live routes need sticky routing at the proxy (LIVE_STICKY_ROUTING=1)
+os.environ["GUNICORN_WORKERS"] = str(workers)
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+# Live event streams each hold one of these threads; the app admits at most
+# half of them (LIVE_MAX_STREAMS)
+os.environ["GUNICORN_THREADS"] = str(threads)
+timeout = 120
+
+# TensorFlow defaults to one intra-op thread per core in every worker, so N
+# workers oversubscribe the CPUs N times over. Split the cores between the
+# workers instead. These are only environment variables: the FER loader
+# (detectors._load_face) sizes the pools from them right before it imports
+# TensorFlow in a worker, so text-only and FACE_CLASSIFIER=dnn workers never
+# import it. Measure other settings with bench_face_workers.py
+# (--start-method fork matches gunicorn).
+os.environ.setdefault("TF_INTRA_OP_THREADS", str(max(1, (os.cpu_count() or 1) // workers)))
+os.environ.setdefault("TF_INTER_OP_THREADS", "1")
+
+# WORKER_CPU_AFFINITY=1 also pins each worker to its own slice of the CPUs
+cpu_affinity = os.getenv("WORKER_CPU_AFFINITY", "0").lower() in ("1", "true", "yes")
+
+
+def pre_fork(server, worker):
+    # Runs in the master. Give the new worker the lowest CPU slot no live
+    # worker holds: server.WORKERS maps pid -> worker and drops a pid as soon
+    # as it is reaped, so a restarted worker reuses the slot it left free.
+    taken = {w.cpu_slot for w in server.WORKERS.values()}
+    worker.cpu_slot = next(slot for slot in itertools.count() if slot not in taken)
+
+
+def post_fork(server, worker):
+    if cpu_affinity:
+        import detectors
+        detectors.pin_worker(worker.cpu_slot, workers)
+
+
+def when_ready(server):
+    if "tensorflow" in sys.modules:
+        server.log.warning("TensorFlow was imported in the master before fork; workers may deadlock. "
+                           "Move TensorFlow backends from EAGER_DETECTORS to WORKER_EAGER_DETECTORS.")
+
+
+def post_worker_init(worker):
+    import detectors
+    detectors.preload(worker_eager_detectors)
@@ -0,0 +1,214 @@
+from collections import deque
+import logging
+import threading
+import time
+
+import numpy as np
+
+import detectors
+import face_pipeline
+from face_tracker import FaceTracker
+
+# Live face emotion for browser clients.
+# The browser POSTs downscaled JPEG frames; each connection has one inference
+# thread that always takes the newest frame (latest-wins): a frame that
+# arrives while the previous one is still waiting replaces it and counts as
+# dropped, so nothing queues up when inference falls behind. Results fold
+# into a short half-life MoodTracker entry, the rolling estimate pushed back
+# to the browser over Server-Sent Events.
+#
+# Sessions live in the memory of the process that created them: with several
+# gunicorn workers, a session's frame uploads and its event stream must reach
+# the same worker (sticky routing), or the app must run a single worker.
+
+log = logging.getLogger("live_stream")
+
+
+class LiveSession:
+    """One streaming connection: a latest-wins frame slot and its inference thread."""
+
+    def __init__(self, session_id, mood_tracker, window=100):
+        self.session_id = session_id
+        self.mood_tracker = mood_tracker
+        self.tracker = FaceTracker()
+        self.result = None
+        self.seq = 0                  # results produced so far
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.decode_errors = 0
+        self.errors = 0
+        self.closed = False
+        self.last_seen = time.monotonic()
+        self._frame = None            # newest frame not yet taken by the thread
+        self._received_at = deque(maxlen=window)
+        self._processed_at = deque(maxlen=window)
+        self._latencies = deque(maxlen=window)
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=f"live-{session_id}", daemon=True)
+        self._thread.start()
+
+    def push(self, data):
+        """Hand a frame to the inference thread; returns False if it replaced an unprocessed one."""
+        with self._cond:
+            replaced = self._frame is not None
+            self.dropped += replaced
+            self._frame = data
+            self.received += 1
+            self.last_seen = time.monotonic()
+            self._received_at.append(self.last_seen)
+            self._cond.notify_all()
+            return not replaced
+
+    def results(self, timeout=15.0):
+        """Yield each newest result, or None when nothing new arrived within timeout."""
+        seen = 0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self.seq > seen or self.closed, timeout)
+                if self.closed:
+                    return
+                if self.seq == seen:
+                    result = None
+                else:
+                    result, seen = self.result, self.seq
+            yield result
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            latencies = sorted(self._latencies)
+            return {
+                "received": self.received,
+                "processed": self.processed,
+                "dropped": self.dropped,
+                "decode_errors": self.decode_errors,
+                "errors": self.errors,
+                "drop_rate": self.dropped / self.received if self.received else 0.0,
+                "received_fps": _rate(self._received_at),
+                "processed_fps": _rate(self._processed_at),
+                "latency_ms_mean": 1000 * sum(latencies) / len(latencies) if latencies else None,
+                "latency_ms_p95": 1000 * latencies[int(0.95 * (len(latencies) - 1))] if latencies else None,
+            }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._frame is not None or self.closed)
+                if self.closed:
+                    return
+                data, self._frame = self._frame, None
+
+            # A failing frame must not end the thread: the session would keep
+            # accepting frames that nothing processes
+            try:
+                result = self._process(data)
+            except Exception as e:
+                log.exception("Live session %s: frame failed", self.session_id)
+                with self._cond:
+                    self.errors += 1
+                    self.seq += 1
+                    self.result = {"seq": self.seq, "error": f"{type(e).__name__}: {e}"}
+                    self._cond.notify_all()
+                continue
+            if result is None:
+                with self._cond:
+                    self.decode_errors += 1
+                continue
+
+            with self._cond:
+                self.processed += 1
+                self._processed_at.append(time.monotonic())
+                self._latencies.append(result["latency_ms"] / 1000)
+                self.seq += 1
+                self.result = dict(result, seq=self.seq)
+                self._cond.notify_all()
+
+    def _process(self, data):
+        """Decode and classify one frame; None if it is not an image."""
+        cv2 = detectors.get("cv2")
+        start = time.perf_counter()
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            return None
+        face = self.tracker.process(frame)
+        if face is not None:
+            vector = np.array([face["emotions"][label] for label in face_pipeline.LABELS], dtype=np.float32)
+            mood = self.mood_tracker.update(self.session_id, vector)
+        else:
+            mood = self.mood_tracker.mood(self.session_id)
+        return {"face": face, "mood": mood, "latency_ms": 1000 * (time.perf_counter() - start)}
+
+
+class LiveSessions:
+    """Registry of live sessions; idle ones are closed, the oldest go when full.
+
+    Every open event stream holds a server thread for as long as the client
+    listens, so at most max_streams are admitted at once (open_stream).
+    """
+
+    def __init__(self, mood_tracker, max_sessions=100, idle_timeout=60.0, max_streams=2):
+        self.mood_tracker = mood_tracker
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_streams = max_streams
+        self.streams = 0
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def open_stream(self):
+        """Claim one of the max_streams event stream slots; False when all are taken."""
+        with self._lock:
+            if self.streams >= self.max_streams:
+                return False
+            self.streams += 1
+            return True
+
+    def close_stream(self):
+        with self._lock:
+            self.streams -= 1
+
+    def get(self, session_id, create=False):
+        with self._lock:
+            self._close_idle()
+            session = self._sessions.get(session_id)
+            if session is None and create:
+                if len(self._sessions) >= self.max_sessions:
+                    oldest = min(self._sessions.values(), key=lambda s: s.last_seen)
+                    self._remove(oldest.session_id)
+                session = self._sessions[session_id] = LiveSession(session_id, self.mood_tracker)
+            return session
+
+    def close(self, session_id):
+        with self._lock:
+            return self._remove(session_id)
+
+    def stats(self):
+        with self._lock:
+            return {"sessions": len(self._sessions), "max_sessions": self.max_sessions,
+                    "streams": self.streams, "max_streams": self.max_streams}
+
+    def _remove(self, session_id):
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.close()
+        self.mood_tracker.drop(session_id)
+        return True
+
+    def _close_idle(self):
+        now = time.monotonic()
+        for session_id in [s.session_id for s in self._sessions.values() if now - s.last_seen > self.idle_timeout]:
+            self._remove(session_id)
+
+
+def _rate(timestamps):
+    """Events per second over the timestamps still in the window."""
+    if len(timestamps) < 2:
+        return 0.0
+    span = timestamps[-1] - timestamps[0]
+    return (len(timestamps) - 1) / span if span > 0 else 0.0
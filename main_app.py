@@ -1,8 +1,10 @@
 from flask import Flask, render_template, request, redirect, url_for, session
-import cv2
-import speech_recognition as sr
-from textblob import TextBlob
-from fer import FER
+from capture_service import CaptureService
+import detectors
+from emotion_cache import FrameCache
+import face_pipeline
+import face_voting
+import sentiment_engine
 from spotipy.oauth2 import SpotifyOAuth
 import spotipy
 import os
@@ -21,6 +23,12 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 app = Flask(__name__)
 app.secret_key = SECRET_KEY  # Set the session secret key
 
+# Webcam capture mode: "first", "group" or "vote" (see detect_faces_and_emotions)
+app.config['FACE_CAPTURE_MODE'] = os.getenv("FACE_CAPTURE_MODE", "first")
+
+# Load detector backends listed in EAGER_DETECTORS now, the rest on first use
+detectors.preload()
+
 # Initialize SpotifyOAuth with required scope
 sp_oauth = SpotifyOAuth(
     client_id=SPOTIPY_CLIENT_ID,
@@ -30,44 +38,48 @@ sp_oauth = SpotifyOAuth(
 )
 
 # Helper function to detect facial emotion
-def detect_faces_and_emotions():
-    # Initialize FER emotion detector without MTCNN
-    detector = FER(mtcnn=False)
-
-    # Access the webcam
-    cap = cv2.VideoCapture(0)
+def detect_faces_and_emotions(mode="first"):
+    # Shared FER emotion detector (without MTCNN), loaded once per process
+    detector = detectors.get("face")
 
-    if not cap.isOpened():
+    # Capture on a background thread; CAPTURE_HEADLESS=1 skips the preview window
+    capture = CaptureService(0)
+    if not capture.start():
         print("Error: Could not access the webcam.")
         return None
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("Error: Could not read a frame from the webcam.")
-            break
-
-        # Detect emotions using FER
-        emotion, score = detector.top_emotion(frame)
-        if emotion:
-            print(f"Detected Emotion: {emotion} (Score: {score:.2f})")
-            cap.release()
-            cv2.destroyAllWindows()
-            return emotion
-
-        # Display the video feed
-        cv2.imshow("Facial Emotion Detection", frame)
-
-        # Press 'q' to quit
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-
-    cap.release()
-    cv2.destroyAllWindows()
+    with capture:
+        # vote: vote over several downscaled frames within a time budget
+        if mode == "vote":
+            result = face_voting.vote_emotion(capture.frames(), detector)
+            print(f"Detected Emotion: {result['emotion']} (Confidence: {result['confidence']:.2f}, "
+                  f"{result['frames']} frames in {result['seconds']:.2f}s)")
+            return result["emotion"]
+
+        # group: weighted mood of every face, classified in one batch
+        group_mode = mode == "group"
+
+        # Inference always runs on the newest frame; stale ones are dropped
+        frame_cache = FrameCache(maxsize=64, max_distance=4, ttl=1.0)
+        for frame in capture.frames():
+            if group_mode:
+                group = face_pipeline.group_mood(face_pipeline.detect_faces(frame, detector))
+                emotion, score = (group["mood"], group["emotions"][group["mood"]]) if group else (None, None)
+            else:
+                # Detect emotions using FER; near-identical frames reuse the last result
+                emotion, score = frame_cache.lookup(frame, lambda: face_pipeline.top_emotion(frame, detector))
+            if emotion:
+                print(f"Detected Emotion: {emotion} (Score: {score:.2f})")
+                return emotion
+
+            # Display the video feed; press 'q' to quit
+            if not capture.show(frame):
+                break
     return None
 
 # Helper function to detect audio emotion
 def detect_audio_emotion():
+    sr = detectors.get("audio")
     recognizer = sr.Recognizer()
 
     with sr.Microphone() as source:
@@ -84,8 +96,7 @@ def detect_audio_emotion():
 
 # Helper function to detect text emotion
 def detect_text_emotion(text):
-    analysis = TextBlob(text)
-    polarity = analysis.sentiment.polarity
+    polarity = sentiment_engine.polarity(text)
 
     if polarity > 0:
         return "Positive"
@@ -101,7 +112,7 @@ def detect_emotion():
     detected_emotion = None
 
     if emotion_type == "facial":
-        detected_emotion = detect_faces_and_emotions()  # Call the facial emotion detection
+        detected_emotion = detect_faces_and_emotions(app.config['FACE_CAPTURE_MODE'])  # Call the facial emotion detection
     elif emotion_type == "text":
         text = request.form["text"]
         detected_emotion = detect_text_emotion(text)  # Call the text emotion detection
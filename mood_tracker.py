@@ -0,0 +1,185 @@
+from collections import OrderedDict
+from contextlib import closing
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+
+class MoodTracker:
+    """Per-session running mood over a stream of chat messages.
+
+    Each session keeps an exponentially decayed sum of message emotion
+    vectors and of their weights, so adding a message is O(1) and the current
+    mood is their ratio, with no rescoring of earlier messages. State lives in
+    preallocated arrays indexed by slot; the least recently updated session is
+    evicted when the store is full, and sessions idle for longer than
+    idle_timeout seconds are dropped.
+    """
+
+    def __init__(self, labels, max_sessions=10000, half_life=300.0, idle_timeout=3600.0):
+        self.labels = tuple(labels)
+        self.max_sessions = max_sessions
+        self.half_life = half_life
+        self.idle_timeout = idle_timeout
+        self.evictions = 0
+        self._vectors = np.zeros((max_sessions, len(self.labels)), dtype=np.float32)
+        self._weights = np.zeros(max_sessions, dtype=np.float32)
+        self._updated = np.zeros(max_sessions, dtype=np.float64)
+        self._messages = np.zeros(max_sessions, dtype=np.int32)
+        self._slots = OrderedDict()  # session id -> slot, least recently updated first
+        self._free = list(range(max_sessions - 1, -1, -1))
+        self._lock = threading.Lock()
+
+    def update(self, session_id, vector, now=None):
+        """Fold one message's emotion vector into the session's mood and return the mood."""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._evict_idle(now)
+            slot = self._slots.get(session_id)
+            if slot is None:
+                slot = self._new_slot(session_id)
+            else:
+                self._slots.move_to_end(session_id)
+                decay = 0.5 ** ((now - self._updated[slot]) / self.half_life)
+                self._vectors[slot] *= decay
+                self._weights[slot] *= decay
+            self._vectors[slot] += vector
+            self._weights[slot] += 1.0
+            self._updated[slot] = now
+            self._messages[slot] += 1
+            return self._mood(slot)
+
+    def mood(self, session_id, now=None):
+        """Return the current mood of a session, or None if it is unknown or idle."""
+        now = time.time() if now is None else now
+        with self._lock:
+            slot = self._slots.get(session_id)
+            if slot is None or now - self._updated[slot] > self.idle_timeout:
+                return None
+            return self._mood(slot)
+
+    def drop(self, session_id):
+        with self._lock:
+            slot = self._slots.pop(session_id, None)
+            if slot is not None:
+                self._free.append(slot)
+            return slot is not None
+
+    def stats(self):
+        with self._lock:
+            return {"sessions": len(self._slots), "max_sessions": self.max_sessions, "evictions": self.evictions}
+
+    def _new_slot(self, session_id):
+        if not self._free:
+            _, slot = self._slots.popitem(last=False)
+            self._free.append(slot)
+            self.evictions += 1
+        slot = self._free.pop()
+        self._vectors[slot] = 0.0
+        self._weights[slot] = 0.0
+        self._messages[slot] = 0
+        self._slots[session_id] = slot
+        return slot
+
+    def _evict_idle(self, now):
+        # Sessions are ordered by last update, so only the stale head is scanned.
+        while self._slots:
+            session_id, slot = next(iter(self._slots.items()))
+            if now - self._updated[slot] <= self.idle_timeout:
+                break
+            del self._slots[session_id]
+            self._free.append(slot)
+            self.evictions += 1
+
+    def _mood(self, slot):
+        return _mood(self.labels, self._vectors[slot], self._weights[slot], self._messages[slot], self._updated[slot])
+
+
+class SqliteMoodTracker:
+    """MoodTracker with its state in a SQLite file, shared by every process that opens it.
+
+    Same decayed sums and API as MoodTracker; each update is one short write
+    transaction, so gunicorn workers can serve the same session in turn.
+    """
+
+    def __init__(self, path, labels, max_sessions=10000, half_life=300.0, idle_timeout=3600.0):
+        self.path = path
+        self.labels = tuple(labels)
+        self.max_sessions = max_sessions
+        self.half_life = half_life
+        self.idle_timeout = idle_timeout
+        self._local = threading.local()
+        # The app is often built in gunicorn's master before it forks, and a
+        # SQLite connection must not cross fork: set up the schema on a
+        # connection closed right away, workers open their own in _connect()
+        with closing(sqlite3.connect(path, timeout=30, isolation_level=None)) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("CREATE TABLE IF NOT EXISTS moods (session_id TEXT PRIMARY KEY, vector BLOB, "
+                       "weight REAL, updated REAL, messages INTEGER)")
+            db.execute("CREATE INDEX IF NOT EXISTS moods_updated ON moods (updated)")
+
+    def update(self, session_id, vector, now=None):
+        """Fold one message's emotion vector into the session's mood and return the mood."""
+        now = time.time() if now is None else now
+        db = self._connect()
+        with db:
+            db.execute("BEGIN IMMEDIATE")  # read-modify-write under the file's write lock
+            db.execute("DELETE FROM moods WHERE updated < ?", (now - self.idle_timeout,))
+            row = db.execute("SELECT vector, weight, updated, messages FROM moods WHERE session_id = ?",
+                             (session_id,)).fetchone()
+            if row is None:
+                total, weight, messages = np.zeros(len(self.labels), dtype=np.float32), 0.0, 0
+            else:
+                decay = 0.5 ** ((now - row[2]) / self.half_life)
+                total = np.frombuffer(row[0], dtype=np.float32) * decay
+                weight, messages = row[1] * decay, row[3]
+            total = (total + vector).astype(np.float32)
+            weight += 1.0
+            messages += 1
+            db.execute("INSERT OR REPLACE INTO moods VALUES (?, ?, ?, ?, ?)",
+                       (session_id, total.tobytes(), weight, now, messages))
+            if row is None:
+                # Least recently updated sessions go first when the store is full
+                db.execute("DELETE FROM moods WHERE session_id IN (SELECT session_id FROM moods "
+                           "ORDER BY updated DESC LIMIT -1 OFFSET ?)", (self.max_sessions,))
+        return _mood(self.labels, total, weight, messages, now)
+
+    def mood(self, session_id, now=None):
+        """Return the current mood of a session, or None if it is unknown or idle."""
+        now = time.time() if now is None else now
+        row = self._connect().execute("SELECT vector, weight, messages, updated FROM moods "
+                                      "WHERE session_id = ? AND updated >= ?",
+                                      (session_id, now - self.idle_timeout)).fetchone()
+        return None if row is None else _mood(self.labels, np.frombuffer(row[0], dtype=np.float32), *row[1:])
+
+    def drop(self, session_id):
+        db = self._connect()
+        with db:
+            return db.execute("DELETE FROM moods WHERE session_id = ?", (session_id,)).rowcount > 0
+
+    def stats(self):
+        sessions = self._connect().execute("SELECT COUNT(*) FROM moods").fetchone()[0]
+        return {"sessions": sessions, "max_sessions": self.max_sessions, "path": self.path}
+
+    def _connect(self):
+        # One connection per thread and process; sqlite3 connections must not
+        # be shared, and a forked child never reuses its parent's
+        pid, db = getattr(self._local, "db", (None, None))
+        if pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.db = (os.getpid(), db)
+        return db
+
+
+def _mood(labels, vector, weight, messages, updated):
+    # Decay scales the sums and the weight alike, so their ratio needs no decay.
+    scores = np.asarray(vector) / max(float(weight), 1e-12)
+    return {
+        "mood": labels[int(np.argmax(scores))],
+        "scores": dict(zip(labels, scores.tolist())),
+        "messages": int(messages),
+        "updated": float(updated),
+    }
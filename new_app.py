@@ -1,15 +1,25 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, Response, stream_with_context
+from werkzeug.exceptions import RequestEntityTooLarge
 from flask_bcrypt import Bcrypt
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, timedelta, timezone
-import cv2
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
 import os
+import json
+import codecs
+import numpy as np
 from dotenv import load_dotenv
-from textblob import TextBlob
-import speech_recognition as sr
-from fer import FER
+from capture_service import CaptureService
+import detectors
+import sentiment_engine
+import text_classifier
+from emotion_cache import FrameCache, ResultCache, content_key, text_key
+from mood_tracker import MoodTracker, SqliteMoodTracker
+import face_pipeline
+import face_voting
+from face_batcher import MicroBatcher
+from live_stream import LiveSessions
 
 
 # Load environment variables
@@ -20,11 +30,99 @@ app = Flask(__name__)
 app.secret_key = os.getenv("SECRET_KEY")
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///users.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Detector backends to load at startup instead of on first use (e.g. "face,audio")
+app.config['EAGER_DETECTORS'] = os.getenv("EAGER_DETECTORS", "text")
+# Batches at least this large are scored across a process pool
+app.config['EMOTION_BATCH_POOL_MIN'] = int(os.getenv("EMOTION_BATCH_POOL_MIN", 20000))
+app.config['EMOTION_BATCH_POOL_WORKERS'] = int(os.getenv("EMOTION_BATCH_POOL_WORKERS", 0)) or None
+# Largest request body Flask reads for any route (0: no limit); views with
+# tighter limits set request.max_content_length. Both are enforced while the
+# body is read, so chunked uploads without Content-Length are capped too.
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv("MAX_CONTENT_LENGTH", 256 * 1024 * 1024)) or None
+# Largest accepted image upload for /api/emotion/face
+app.config['FACE_UPLOAD_MAX_BYTES'] = int(os.getenv("FACE_UPLOAD_MAX_BYTES", 10 * 1024 * 1024))
+# Webcam capture: "first" returns the first frame with a face, "group" the
+# size/confidence-weighted mood of every face in that frame, "vote" votes over
+# downscaled frames and stops on a clear margin or the deadline (seconds)
+app.config['FACE_CAPTURE_MODE'] = os.getenv("FACE_CAPTURE_MODE", "first")
+# "first" and "group" give up after this many seconds without a face in view
+app.config['FACE_CAPTURE_DEADLINE'] = float(os.getenv("FACE_CAPTURE_DEADLINE", 10.0))
+# Server capture shows no preview window unless CAPTURE_HEADLESS=0
+app.config['CAPTURE_HEADLESS'] = os.getenv("CAPTURE_HEADLESS", "1").lower() in ("1", "true", "yes")
+app.config['FACE_VOTE_SCALE'] = float(os.getenv("FACE_VOTE_SCALE", 0.5))
+app.config['FACE_VOTE_MAX_FRAMES'] = int(os.getenv("FACE_VOTE_MAX_FRAMES", 15))
+app.config['FACE_VOTE_MARGIN'] = float(os.getenv("FACE_VOTE_MARGIN", 0.5))
+app.config['FACE_VOTE_DEADLINE'] = float(os.getenv("FACE_VOTE_DEADLINE", 3.0))
+# Micro-batching of face classification across concurrent requests (window 0 turns it off)
+app.config['FACE_BATCH_WINDOW_MS'] = float(os.getenv("FACE_BATCH_WINDOW_MS", 10))
+app.config['FACE_BATCH_MAX'] = int(os.getenv("FACE_BATCH_MAX", 32))
+# Text emotion backend: "polarity" (happy/sad/neutral) or "linear" (FER label set)
+app.config['TEXT_EMOTION_BACKEND'] = os.getenv("TEXT_EMOTION_BACKEND", "polarity")
+# Text emotion result cache (size 0 turns it off, TTL 0 means no expiry)
+app.config['EMOTION_CACHE_SIZE'] = int(os.getenv("EMOTION_CACHE_SIZE", 10000))
+app.config['EMOTION_CACHE_TTL'] = float(os.getenv("EMOTION_CACHE_TTL", 0)) or None
+# Face result caches: exact uploaded bytes, shared by all clients, and
+# near-identical frames (dHash within FRAME_CACHE_DISTANCE bits) of one webcam
+# capture only, expiring after FRAME_CACHE_TTL s. Unrelated images can share
+# a dHash, so the perceptual cache never spans captures or uploads.
+app.config['FACE_CACHE_SIZE'] = int(os.getenv("FACE_CACHE_SIZE", 1024))
+app.config['FRAME_CACHE_SIZE'] = int(os.getenv("FRAME_CACHE_SIZE", 256))
+app.config['FRAME_CACHE_DISTANCE'] = int(os.getenv("FRAME_CACHE_DISTANCE", 4))
+app.config['FRAME_CACHE_TTL'] = float(os.getenv("FRAME_CACHE_TTL", 1.0)) or None
+# Chat mood tracking: half-life in seconds of a message's influence, idle sessions are dropped
+app.config['MOOD_MAX_SESSIONS'] = int(os.getenv("MOOD_MAX_SESSIONS", 10000))
+app.config['MOOD_HALF_LIFE'] = float(os.getenv("MOOD_HALF_LIFE", 300))
+app.config['MOOD_IDLE_TIMEOUT'] = float(os.getenv("MOOD_IDLE_TIMEOUT", 3600))
+# Where chat mood state lives: "memory" is per process, so with several
+# gunicorn workers (GUNICORN_WORKERS, set by gunicorn.conf.py) a session's
+# requests would land on different trackers; "sqlite" shares MOOD_DB instead
+app.config['MOOD_STORE'] = os.getenv("MOOD_STORE", "sqlite" if int(os.getenv("GUNICORN_WORKERS", 1)) > 1 else "memory")
+app.config['MOOD_DB'] = os.getenv("MOOD_DB", os.path.join(app.instance_path, "mood.db"))
+# Live browser streaming: frames larger than this are rejected, a session's
+# rolling estimate halves a frame's weight every LIVE_HALF_LIFE seconds
+app.config['LIVE_MAX_FRAME_BYTES'] = int(os.getenv("LIVE_MAX_FRAME_BYTES", 512 * 1024))
+app.config['LIVE_MAX_SESSIONS'] = int(os.getenv("LIVE_MAX_SESSIONS", 100))
+app.config['LIVE_HALF_LIFE'] = float(os.getenv("LIVE_HALF_LIFE", 2.0))
+app.config['LIVE_IDLE_TIMEOUT'] = float(os.getenv("LIVE_IDLE_TIMEOUT", 60))
+# Each open event stream holds a server thread (GUNICORN_THREADS per worker);
+# past LIVE_MAX_STREAMS new streams get a 503 so ordinary requests still run
+app.config['LIVE_MAX_STREAMS'] = int(os.getenv("LIVE_MAX_STREAMS", max(1, int(os.getenv("GUNICORN_THREADS", 4)) // 2)))
+# Live sessions are held in one process's memory: with several gunicorn
+# workers the live routes answer 503 unless the proxy sends every request of
+# a session to the same worker and LIVE_STICKY_ROUTING=1 says so
+app.config['LIVE_STICKY_ROUTING'] = os.getenv("LIVE_STICKY_ROUTING", "0").lower() in ("1", "true", "yes")
 
 
 # Initialize extensions
+detectors.preload(app.config['EAGER_DETECTORS'])
 bcrypt = Bcrypt(app)
 db = SQLAlchemy(app)
+text_emotion_cache = ResultCache(app.config['EMOTION_CACHE_SIZE'], app.config['EMOTION_CACHE_TTL'])
+face_upload_cache = ResultCache(app.config['FACE_CACHE_SIZE'])
+face_batcher = MicroBatcher(app.config['FACE_BATCH_WINDOW_MS'], app.config['FACE_BATCH_MAX'])
+if app.config['MOOD_STORE'] == "sqlite":
+    os.makedirs(os.path.dirname(app.config['MOOD_DB']) or ".", exist_ok=True)
+    mood_tracker = SqliteMoodTracker(
+        app.config['MOOD_DB'],
+        text_classifier.LABELS,
+        max_sessions=app.config['MOOD_MAX_SESSIONS'],
+        half_life=app.config['MOOD_HALF_LIFE'],
+        idle_timeout=app.config['MOOD_IDLE_TIMEOUT'],
+    )
+else:
+    mood_tracker = MoodTracker(
+        text_classifier.LABELS,
+        max_sessions=app.config['MOOD_MAX_SESSIONS'],
+        half_life=app.config['MOOD_HALF_LIFE'],
+        idle_timeout=app.config['MOOD_IDLE_TIMEOUT'],
+    )
+live_sessions = LiveSessions(
+    MoodTracker(face_pipeline.LABELS, max_sessions=app.config['LIVE_MAX_SESSIONS'],
+                half_life=app.config['LIVE_HALF_LIFE'], idle_timeout=app.config['LIVE_IDLE_TIMEOUT']),
+    max_sessions=app.config['LIVE_MAX_SESSIONS'],
+    idle_timeout=app.config['LIVE_IDLE_TIMEOUT'],
+    max_streams=app.config['LIVE_MAX_STREAMS'],
+)
 
 # Spotify credentials
 SPOTIPY_CLIENT_ID = os.getenv("SPOTIPY_CLIENT_ID")
@@ -93,33 +191,64 @@ def get_token_info():
     return user.access_token
 
 
-def detect_faces_and_emotions():
-    """Detect emotion from facial expressions using webcam."""
-    detector = FER(mtcnn=False)
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
+def detect_faces_and_emotions(mode="first"):
+    """Detect emotion from facial expressions using webcam; mode is "first", "group" or "vote"."""
+    detector = detectors.get("face")
+    capture = CaptureService(0, headless=app.config['CAPTURE_HEADLESS'])
+    if not capture.start():
         print("Error: Could not access the webcam.")
         return None
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("Error: Could not read a frame from the webcam.")
-            break
-        emotion, score = detector.top_emotion(frame)
-        if emotion:
-            cap.release()
-            cv2.destroyAllWindows()
-            return emotion
-        cv2.imshow("Facial Emotion Detection", frame)
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-    cap.release()
-    cv2.destroyAllWindows()
+    with capture:
+        if mode == "vote":
+            result = face_voting.vote_emotion(
+                capture.frames(deadline=app.config['FACE_VOTE_DEADLINE']), detector,
+                scale=app.config['FACE_VOTE_SCALE'],
+                max_frames=app.config['FACE_VOTE_MAX_FRAMES'],
+                margin=app.config['FACE_VOTE_MARGIN'],
+                deadline=app.config['FACE_VOTE_DEADLINE'],
+            )
+            print(f"Voted emotion: {result['emotion']} ({result['frames']} frames, "
+                  f"{result['seconds']:.2f}s, stopped on {result['stopped']})")
+            return result["emotion"]
+        group_mode = mode == "group"
+        frame_cache = FrameCache(app.config['FRAME_CACHE_SIZE'], app.config['FRAME_CACHE_DISTANCE'],
+                                 app.config['FRAME_CACHE_TTL'])
+        # Always classify the newest captured frame; older ones are dropped.
+        # Headless, show() never stops the loop, so the deadline has to
+        for frame in capture.frames(deadline=app.config['FACE_CAPTURE_DEADLINE']):
+            if group_mode:
+                # Every face in one batched classifier call, then the weighted group mood
+                group = face_pipeline.group_mood(face_pipeline.detect_faces(frame, detector))
+                emotion = group["mood"] if group else None
+            else:
+                # Near-identical frames reuse the last result instead of re-detecting
+                emotion, score = frame_cache.lookup(frame, lambda: face_pipeline.top_emotion(frame, detector))
+            if emotion:
+                return emotion
+            if not capture.show(frame):
+                break
     return None
 
 
+def decode_image(data):
+    """Decode JPEG/PNG/WebP bytes into a BGR array without temp files."""
+    cv2 = detectors.get("cv2")
+    # frombuffer wraps the bytes without copying; imdecode reads them directly
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def detect_image_emotions(image):
+    """Run the shared FER detector on an image, one entry per face.
+
+    All faces of the image go through the classifier in one batch.
+    """
+    classify = face_batcher.classify if app.config['FACE_BATCH_WINDOW_MS'] > 0 else None
+    return face_pipeline.detect_faces(image, classify_fn=classify)
+
+
 def detect_audio_emotion():
     """Detect emotion from voice input."""
+    sr = detectors.get("audio")
     recognizer = sr.Recognizer()
     with sr.Microphone() as source:
         print("Listening...")
@@ -133,9 +262,29 @@ def detect_audio_emotion():
 
 
 def detect_text_emotion(text):
-    """Detect emotion from text using TextBlob."""
-    analysis = TextBlob(text)
-    polarity = analysis.sentiment.polarity
+    """Detect emotion from text with the configured backend, memoized per text."""
+    return text_emotion_cache.lookup(text_key(text), lambda: score_text_emotion(text))
+
+
+def score_text_emotion(text):
+    """Run the configured text emotion backend."""
+    if app.config['TEXT_EMOTION_BACKEND'] == "linear":
+        return text_classifier.classify(text)
+    return emotion_from_polarity(sentiment_engine.polarity(text))
+
+
+def text_emotion_vector(text):
+    """Score a text over the FER label set, for the chat mood tracker."""
+    if app.config['TEXT_EMOTION_BACKEND'] == "linear":
+        scores = text_classifier.scores(text)
+        return [scores[label] for label in text_classifier.LABELS]
+    polarity = sentiment_engine.polarity(text)
+    scores = {"happy": max(polarity, 0.0), "sad": max(-polarity, 0.0), "neutral": 1.0 - abs(polarity)}
+    return [scores.get(label, 0.0) for label in text_classifier.LABELS]
+
+
+def emotion_from_polarity(polarity):
+    """Map a sentiment polarity to an emotion label."""
     if polarity > 0:
         return "happy"
     elif polarity < 0:
@@ -332,7 +481,7 @@ def detect_emotion():
     elif emotion_type == "audio":
         emotion = detect_audio_emotion()
     else:
-        emotion = detect_faces_and_emotions()
+        emotion = detect_faces_and_emotions(app.config['FACE_CAPTURE_MODE'])
 
     if not emotion:
         flash("No emotion detected. Please try again.")
@@ -511,6 +660,216 @@ def api_detect_emotion():
     return {"emotion": emotion}, 200
 
 
+def read_text_chunks(stream, size=65536):
+    """Decode a binary request stream into text chunks of at most `size` bytes."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    for block in iter(lambda: stream.read(size), b""):
+        yield decoder.decode(block)
+    yield decoder.decode(b"", final=True)
+
+
+@app.route("/api/emotion/stream", methods=["POST"])
+def api_detect_emotion_stream():
+    """Score a long plain-text body sentence by sentence without holding it in memory.
+
+    ?timeline=N adds the emotion of every N sentences to the response.
+    """
+    timeline_every = max(request.args.get("timeline", 0, type=int), 0)
+    result = sentiment_engine.stream_polarity(read_text_chunks(request.stream), timeline_every)
+    result["emotion"] = emotion_from_polarity(result["polarity"])
+    for entry in result["timeline"]:
+        entry["emotion"] = emotion_from_polarity(entry["polarity"])
+    return result, 200
+
+
+def read_limited_body(limit):
+    """The request body, raising RequestEntityTooLarge past limit bytes even without Content-Length.
+
+    Form fields and files are parsed from the same bytes afterwards.
+    """
+    # A streamed body is cut off silently at max_content_length; one byte of
+    # slack tells a body of exactly `limit` bytes from a longer one
+    request.max_content_length = limit + 1
+    try:
+        data = request.get_data()
+    finally:
+        request.max_content_length = limit
+    if len(data) > limit:
+        raise RequestEntityTooLarge()
+    return data
+
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    if request.path.startswith("/api/"):
+        return {"error": "Request body too large", "max_bytes": request.max_content_length}, 413
+    return e
+
+
+@app.route("/api/mood/<session_id>", methods=["POST"])
+def api_update_mood(session_id):
+    """Add chat messages ({"text": ...} or {"messages": [...]}) to a session's running mood."""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return {"error": "Expected a JSON object"}, 400
+    messages = data.get("messages") or [data.get("text")]
+    if not isinstance(messages, list) or not all(isinstance(message, str) for message in messages):
+        return {"error": "Expected a 'text' string or a 'messages' list of strings"}, 400
+    for message in messages:
+        mood = mood_tracker.update(session_id, text_emotion_vector(message))
+    return mood, 200
+
+
+@app.route("/api/mood/<session_id>", methods=["GET"])
+def api_get_mood(session_id):
+    mood = mood_tracker.mood(session_id)
+    if mood is None:
+        return {"error": "Unknown session"}, 404
+    return mood, 200
+
+
+@app.route("/api/mood/<session_id>", methods=["DELETE"])
+def api_drop_mood(session_id):
+    return {"dropped": mood_tracker.drop(session_id)}, 200
+
+
+@app.route("/api/emotion/face", methods=["POST"])
+def api_detect_face_emotion():
+    """Detect face emotions in an uploaded image (multipart "image" field or raw body)."""
+    data = read_limited_body(app.config['FACE_UPLOAD_MAX_BYTES'])
+    upload = request.files.get("image") or next(iter(request.files.values()), None)
+    if upload:
+        data = upload.read()
+    if not data:
+        return {"error": "No image data"}, 400
+
+    # Identical bytes skip decoding and detection
+    faces = face_upload_cache.lookup(content_key(data), lambda: detect_upload_emotions(data))
+    if faces is None:
+        return {"error": "Could not decode image"}, 400
+    # The group mood weighs every face by size and confidence; with one face
+    # it is simply that face's top emotion
+    group = face_pipeline.group_mood(faces)
+    return {"emotion": group["mood"] if group else None, "group": group, "faces": faces}, 200
+
+
+def detect_upload_emotions(data):
+    image = decode_image(data)
+    if image is None:
+        return None
+    return detect_image_emotions(image)
+
+
+@app.route("/api/emotion/face/stats")
+def api_face_batch_stats():
+    return face_batcher.stats(), 200
+
+
+@app.route("/api/emotion/face/cache_stats")
+def api_face_cache_stats():
+    return {"content": face_upload_cache.stats()}, 200
+
+
+LIVE_ROUTING_ERROR = {"error": "Live sessions need a single worker or sticky routing (LIVE_STICKY_ROUTING=1)"}
+
+
+def live_routing_ok():
+    """Whether every request of a live session is sure to reach this process."""
+    return int(os.getenv("GUNICORN_WORKERS", 1)) <= 1 or app.config['LIVE_STICKY_ROUTING']
+
+
+@app.route("/live")
+def live():
+    return render_template("live.html")
+
+
+@app.route("/api/live/<session_id>/frame", methods=["POST"])
+def api_live_frame(session_id):
+    """Accept one JPEG frame; never waits for inference (latest frame wins)."""
+    if not live_routing_ok():
+        return LIVE_ROUTING_ERROR, 503
+    data = read_limited_body(app.config['LIVE_MAX_FRAME_BYTES'])
+    if not data:
+        return {"error": "No frame data"}, 400
+    live = live_sessions.get(session_id, create=True)
+    accepted = live.push(data)
+    return {"replaced_pending": not accepted, "estimate": live.result}, 202
+
+
+@app.route("/api/live/<session_id>/events")
+def api_live_events(session_id):
+    """Server-Sent Events stream of the session's newest emotion estimate.
+
+    A frame that failed inference is sent as an "error" event.
+    """
+    if not live_routing_ok():
+        return LIVE_ROUTING_ERROR, 503
+    if not live_sessions.open_stream():
+        return {"error": "Too many live streams"}, 503, {"Retry-After": "10"}
+    live = live_sessions.get(session_id, create=True)
+
+    def events():
+        for result in live.results():
+            if result is None:
+                yield ": keepalive\n\n"
+            elif "error" in result:
+                yield f"event: error\ndata: {json.dumps(dict(result, stats=live.stats()))}\n\n"
+            else:
+                yield f"data: {json.dumps(dict(result, stats=live.stats()))}\n\n"
+
+    response = Response(stream_with_context(events()), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    # Called when the server is done with the response, even if it never started streaming
+    response.call_on_close(live_sessions.close_stream)
+    return response
+
+
+@app.route("/api/live/<session_id>/stats")
+def api_live_stats(session_id):
+    live = live_sessions.get(session_id)
+    if live is None:
+        return {"error": "Unknown session"}, 404
+    return live.stats(), 200
+
+
+@app.route("/api/live/<session_id>", methods=["DELETE"])
+def api_live_close(session_id):
+    return {"closed": live_sessions.close(session_id)}, 200
+
+
+@app.route("/api/emotion/cache_stats")
+def api_emotion_cache_stats():
+    return text_emotion_cache.stats(), 200
+
+
+def parse_batch_texts(body, content_type):
+    """Read texts from a JSON array or NDJSON body. Items are strings or {"text": ...}."""
+    if "ndjson" in content_type or not body.lstrip().startswith(b"["):
+        items = [json.loads(line) for line in body.splitlines() if line.strip()]
+    else:
+        items = json.loads(body)
+    texts = [item.get("text") if isinstance(item, dict) else item for item in items]
+    if not all(isinstance(text, str) for text in texts):
+        raise ValueError("every item must be a string or an object with a 'text' string")
+    return texts
+
+
+@app.route("/api/emotion/batch", methods=["POST"])
+def api_detect_emotion_batch():
+    try:
+        texts = parse_batch_texts(request.get_data(), request.content_type or "")
+    except ValueError as e:
+        return {"error": f"Invalid batch: {e}"}, 400
+
+    if len(texts) >= app.config['EMOTION_BATCH_POOL_MIN']:
+        polarities = sentiment_engine.polarities_parallel(texts, app.config['EMOTION_BATCH_POOL_WORKERS'])
+    else:
+        polarities = sentiment_engine.polarities(texts)
+
+    results = [{"emotion": emotion_from_polarity(p), "polarity": p} for p in polarities.tolist()]
+    return {"results": results}, 200
+
+
 if __name__ == "__main__":
     app.run(debug=True)
 
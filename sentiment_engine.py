@@ -0,0 +1,314 @@
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+import re
+import threading
+
+import numpy as np
+
+from textblob.en import sentiment as pattern_sentiment
+from textblob._text import (
+    ABBREVIATIONS, EMOTICONS, EOS, PUNCTUATION, RE_ABBR1, RE_ABBR2, RE_ABBR3,
+    RE_EMOTICONS, RE_SARCASM, replacements
+)
+
+# Process-wide polarity engine used by every detect_text_emotion.
+# It produces the same polarity as TextBlob(text).sentiment.polarity, but the
+# lexicon is flattened once into lookup tables and scoring runs without
+# building TextBlob, Sentence or assessment objects per call.
+
+NEGATIONS = frozenset(("no", "not", "n't", "never"))
+SENTENCE_END = ("...", ".", "!", "?", EOS)
+SENTENCE_TAIL = ("'", '"', "”", "’", "...", ".", "!", "?", ")", EOS)
+SPLIT_PUNCTUATION = tuple(PUNCTUATION.replace(".", ""))
+TRAILING_PUNCTUATION = SPLIT_PUNCTUATION + (".",)
+REPLACEMENTS = tuple(replacements.items())
+RE_PARAGRAPH = re.compile(r"\n{2,}")  # two or more line breaks end a sentence
+RE_SENTENCE_BREAK = re.compile(r"[.!?][\"')\]’”]*\s+|\n\s*\n\s*")
+QUOTES = (("“", " “ "), ("”", " ” "), ("‘", " ‘ "), ("’", " ’ "), ("'", " ' "), ('"', ' " '))
+
+# Lexicon tables, filled by load().
+VOCAB = {}                  # word -> word id
+POLARITY = array("d")       # word id -> polarity
+INTENSITY = array("d")      # word id -> intensity
+MODIFIER = bytearray()      # word id -> 1 if the word can modify the next one (adverb)
+EMOTICON_POLARITY = {}      # lowercase emoticon -> polarity
+
+_load_lock = threading.Lock()
+
+
+def load():
+    """Flatten the pattern sentiment lexicon into the lookup tables (once per process)."""
+    if VOCAB:
+        return
+    with _load_lock:
+        if VOCAB:
+            return
+        # Plain strings are scored without POS tags, so only the averaged
+        # (pos=None) entry of every word is needed.
+        for word, senses in pattern_sentiment.items():
+            p, s, i = senses[None]
+            POLARITY.append(p)
+            INTENSITY.append(i)
+            MODIFIER.append(1 if "RB" in senses else 0)
+            VOCAB[word] = len(VOCAB)
+        for (_, p), faces in EMOTICONS.items():
+            for face in faces:
+                EMOTICON_POLARITY.setdefault(face.lower(), p)
+
+
+def tokenize(text):
+    """Split text into lowercase tokens exactly like the pattern tokenizer."""
+    for a, b in REPLACEMENTS:
+        text = text.replace(a, b)
+    for a, b in QUOTES:
+        text = text.replace(a, b)
+    if "\n" in text:
+        text = RE_PARAGRAPH.sub(" %s " % EOS, text.replace("\r\n", "\n"))
+
+    tokens = []
+    for t in text.split():
+        if t.isalnum():
+            tokens.append(t)
+            continue
+        tail = []
+        while t.startswith(SPLIT_PUNCTUATION) and t not in replacements:
+            tokens.append(t[0])
+            t = t[1:]
+        while t.endswith(TRAILING_PUNCTUATION) and t not in replacements:
+            if t.endswith(SPLIT_PUNCTUATION):
+                tail.append(t[-1])
+                t = t[:-1]
+            if t.endswith("..."):
+                tail.append("...")
+                t = t[:-3].rstrip(".")
+            if t.endswith("."):
+                if (t in ABBREVIATIONS or RE_ABBR1.match(t) is not None
+                        or RE_ABBR2.match(t) is not None or RE_ABBR3.match(t) is not None):
+                    break
+                tail.append(t[-1])
+                t = t[:-1]
+        if t != "":
+            tokens.append(t)
+        tokens.extend(reversed(tail))
+
+    words = []
+    for sentence in _sentences(tokens):
+        sentence = " ".join(sentence)
+        if "!" in sentence:
+            sentence = RE_SARCASM.sub("(!)", sentence)
+        sentence = RE_EMOTICONS.sub(lambda m: m.group(1).replace(" ", "") + m.group(2), sentence)
+        words.extend(sentence.lower().split())
+    return words
+
+
+def _sentences(tokens):
+    sentence, i, j = [], 0, 0
+    while j < len(tokens):
+        if tokens[j] in SENTENCE_END:
+            while j < len(tokens) and tokens[j] in SENTENCE_TAIL:
+                if tokens[j] in ("'", '"') and sentence.count(tokens[j]) % 2 == 0:
+                    break
+                j += 1
+            sentence.extend(t for t in tokens[i:j] if t != EOS)
+            if sentence:
+                yield sentence
+            sentence = []
+            i = j
+        j += 1
+    sentence.extend(tokens[i:j])
+    if sentence:
+        yield sentence
+
+
+def assessments(tokens):
+    """Yield the final polarity of every assessment in a list of lowercase tokens.
+
+    Mirrors pattern's Sentiment.assessments(): only the latest assessment is
+    ever modified, so it is kept in locals and yielded once the next one starts.
+    """
+    p = i = 0.0
+    negated = False
+    pending = False
+    m = None  # preceding modifier word
+    n = None  # preceding negation word
+    for w in tokens:
+        wid = VOCAB.get(w)
+        if wid is not None:
+            if m is None:
+                if pending:
+                    yield p * -0.5 if negated else p
+                p, i, negated, pending = POLARITY[wid], INTENSITY[wid], False, True
+            else:
+                p = max(-1.0, min(POLARITY[wid] * i, +1.0))
+                i = INTENSITY[wid]
+            if n is not None:
+                i = 1.0 / i
+                negated = True
+            m = w if MODIFIER[wid] else None
+            n = w if w in NEGATIONS else None
+            continue
+
+        if w in NEGATIONS:
+            n = w
+        elif n and len(w.strip("'")) > 1:
+            n = None
+        if n is not None and m is not None and m.endswith("ly"):
+            negated = True
+            n = None
+        elif m and len(w) > 2:
+            m = None
+        if w == "!" and pending:
+            p = max(-1.0, min(p * 1.25, +1.0))
+        if w == "(!)":
+            if pending:
+                yield p * -0.5 if negated else p
+            p, i, negated, pending = 0.0, 1.0, False, True
+        if w.isalpha() is False and len(w) <= 5 and w not in PUNCTUATION:
+            face = EMOTICON_POLARITY.get(w)
+            if face is not None:
+                if pending:
+                    yield p * -0.5 if negated else p
+                p, i, negated, pending = face, 1.0, False, True
+    if pending:
+        yield p * -0.5 if negated else p
+
+
+def score_tokens(tokens):
+    """Return (polarity sum, assessment count) for a list of lowercase tokens."""
+    total = 0.0
+    count = 0
+    for value in assessments(tokens):
+        total += value
+        count += 1
+    return total, count
+
+
+def polarity(text):
+    """Polarity of text between -1.0 and 1.0, identical to TextBlob's PatternAnalyzer."""
+    load()
+    total, count = score_tokens(tokenize(text))
+    return total / float(count or 1)
+
+
+def polarities(texts):
+    """Polarities of many texts as a numpy array, the same values as polarity().
+
+    Scoring is a per-token state machine, so each text is scored on its own;
+    use polarities_parallel() to spread large batches over processes.
+    """
+    load()
+    result = np.empty(len(texts), dtype=np.float64)
+    for index, text in enumerate(texts):
+        total, count = score_tokens(tokenize(text))
+        result[index] = total / float(count or 1)
+    return result
+
+
+def iter_sentences(chunks, max_buffer=65536):
+    """Yield sentences from an iterable of text chunks.
+
+    Only the current partial sentence is buffered. A run-on "sentence" longer
+    than max_buffer is cut at its last space so memory stays bounded.
+    """
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        start = 0
+        for match in RE_SENTENCE_BREAK.finditer(buffer):
+            yield buffer[start:match.end()]
+            start = match.end()
+        buffer = buffer[start:]
+        while len(buffer) > max_buffer:
+            cut = buffer.rfind(" ", 0, max_buffer) + 1 or max_buffer
+            yield buffer[:cut]
+            buffer = buffer[cut:]
+    if buffer.strip():
+        yield buffer
+
+
+def stream_polarity(chunks, timeline_every=0):
+    """Score a long document given as text chunks, in constant memory.
+
+    Sentences are tokenized one at a time and fed through a single
+    assessments() pass, so the running average is the polarity of the whole
+    document. With timeline_every=N, every N sentences are also scored on
+    their own and recorded as a timeline entry.
+    """
+    load()
+    timeline = []
+    chunk_tokens = []
+    sentences = 0
+
+    def add_timeline_entry():
+        total, count = score_tokens(chunk_tokens)
+        timeline.append({
+            "start": timeline[-1]["end"] if timeline else 0,
+            "end": sentences,
+            "polarity": total / float(count or 1),
+        })
+        chunk_tokens.clear()
+
+    def tokens():
+        nonlocal sentences
+        for sentence in iter_sentences(chunks):
+            words = tokenize(sentence)
+            sentences += 1
+            if timeline_every:
+                chunk_tokens.extend(words)
+                if sentences % timeline_every == 0:
+                    add_timeline_entry()
+            yield from words
+
+    total = 0.0
+    count = 0
+    for value in assessments(tokens()):
+        total += value
+        count += 1
+    if timeline_every and sentences % timeline_every:
+        add_timeline_entry()
+    return {"polarity": total / float(count or 1), "sentences": sentences, "timeline": timeline}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, initializer=load)
+        return _pool
+
+
+def polarities_parallel(texts, workers=None, chunk_size=2000):
+    """Score a large list of texts across a process pool, keeping input order."""
+    chunks = [texts[k:k + chunk_size] for k in range(0, len(texts), chunk_size)]
+    if len(chunks) <= 1:
+        return polarities(texts)
+    return np.concatenate(list(_get_pool(workers).map(polarities, chunks)))
+
+
+if __name__ == "__main__":
+    import time
+    from textblob import TextBlob
+
+    samples = [
+        "I'm so happy today!", "feeling down :(", "This is not good at all.",
+        "Really not bad, actually...", "The movie was very very boring", "ok",
+        "I love it <3 (!)", "Worst. Day. Ever.\n\nBut tomorrow will be great :-)",
+    ] * 500
+
+    start = time.perf_counter()
+    expected = [TextBlob(s).sentiment.polarity for s in samples]
+    blob_time = time.perf_counter() - start
+
+    load()
+    start = time.perf_counter()
+    actual = [polarity(s) for s in samples]
+    engine_time = time.perf_counter() - start
+
+    mismatches = sum(1 for a, b in zip(expected, actual) if a != b)
+    print(f"TextBlob: {len(samples) / blob_time:,.0f} texts/s")
+    print(f"Engine:   {len(samples) / engine_time:,.0f} texts/s ({blob_time / engine_time:.1f}x)")
+    print(f"Polarity mismatches: {mismatches}")
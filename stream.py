@@ -5,9 +5,10 @@ import cv2
 import numpy as np
 import os
 from dotenv import load_dotenv
-from textblob import TextBlob
+import sentiment_engine
 import speech_recognition as sr
-from fer import FER
+import detectors
+import face_pipeline
 import requests
 
 # Load environment variables
@@ -36,9 +37,8 @@ def get_spotify_token():
 
 # Emotion detection functions
 def detect_text_emotion(text):
-    """Detect emotion from text using TextBlob."""
-    analysis = TextBlob(text)
-    polarity = analysis.sentiment.polarity
+    """Detect emotion from text using the shared sentiment engine."""
+    polarity = sentiment_engine.polarity(text)
     if polarity > 0:
         return "happy"
     elif polarity < 0:
@@ -61,7 +61,7 @@ def detect_audio_emotion():
 
 def detect_faces_and_emotions():
     """Detect emotion from webcam."""
-    detector = FER(mtcnn=False)
+    detector = detectors.get("face")
     cap = cv2.VideoCapture(0)
     if not cap.isOpened():
         st.error("Error: Could not access the webcam.")
@@ -77,7 +77,7 @@ def detect_faces_and_emotions():
         st.error("Error: Could not capture image.")
         return None
 
-    emotion, score = detector.top_emotion(frame)
+    emotion, score = face_pipeline.top_emotion(frame, detector)
     return emotion
 
 # Fetch tracks from Spotify based on emotion
@@ -0,0 +1,113 @@
+import json
+import os
+import threading
+import zlib
+
+import numpy as np
+
+import sentiment_engine
+
+# Linear text emotion classifier with the same labels as the FER face model.
+# Tokens and token bigrams are hashed into a fixed number of buckets, and the
+# weights live in a single .npy file of shape (N_FEATURES + 1, len(LABELS)),
+# the last row being the bias. The file is memory-mapped read-only, so every
+# worker process shares one physical copy of it through the page cache.
+
+LABELS = ("angry", "disgust", "fear", "happy", "sad", "surprise", "neutral")
+N_FEATURES = 2 ** 18
+MODEL_PATH = os.getenv("TEXT_EMOTION_MODEL", os.path.join(os.path.dirname(__file__), "models", "text_emotion.npy"))
+
+_weights = None
+_load_lock = threading.Lock()
+
+
+def load(path=None):
+    """Memory-map the weight matrix (once per process) and return it."""
+    global _weights
+    if _weights is None:
+        with _load_lock:
+            if _weights is None:
+                weights = np.load(path or MODEL_PATH, mmap_mode="r")
+                if weights.shape != (N_FEATURES + 1, len(LABELS)):
+                    raise ValueError(f"Unexpected text emotion model shape {weights.shape}")
+                _weights = weights
+    return _weights
+
+
+def features(text):
+    """Hash a text into (bucket indices, values): signed counts, L2 normalized."""
+    tokens = sentiment_engine.tokenize(text)
+    counts = {}
+    for gram in tokens + [a + " " + b for a, b in zip(tokens, tokens[1:])]:
+        h = zlib.crc32(gram.encode("utf-8", "surrogatepass"))
+        index = h % N_FEATURES
+        counts[index] = counts.get(index, 0.0) + (-1.0 if h >> 31 else 1.0)
+    indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+    norm = np.sqrt(values @ values)
+    if norm:
+        values /= norm
+    return indices, values
+
+
+def scores(text, weights=None):
+    """Return a {label: probability} dict for the text."""
+    weights = load() if weights is None else weights
+    indices, values = features(text)
+    logits = values @ weights[indices] + weights[N_FEATURES]
+    logits = np.exp(logits - logits.max())
+    return dict(zip(LABELS, (logits / logits.sum()).tolist()))
+
+
+def classify(text):
+    """Return the most likely emotion label for the text."""
+    weights = load()
+    indices, values = features(text)
+    logits = values @ weights[indices] + weights[N_FEATURES]
+    return LABELS[int(np.argmax(logits))]
+
+
+def train(texts, labels, epochs=5, learning_rate=0.5, l2=1e-6, seed=0):
+    """Fit softmax regression weights with plain SGD over hashed features."""
+    rng = np.random.default_rng(seed)
+    weights = np.zeros((N_FEATURES + 1, len(LABELS)), dtype=np.float32)
+    rows = [features(text) for text in texts]
+    targets = np.array([LABELS.index(label) for label in labels])
+    for epoch in range(epochs):
+        rate = learning_rate / (1 + epoch)
+        for k in rng.permutation(len(rows)):
+            indices, values = rows[k]
+            logits = values @ weights[indices] + weights[N_FEATURES]
+            probs = np.exp(logits - logits.max())
+            probs /= probs.sum()
+            probs[targets[k]] -= 1.0
+            weights[indices] -= rate * (np.outer(values, probs) + l2 * weights[indices])
+            weights[N_FEATURES] -= rate * probs
+    return weights
+
+
+def save(weights, path=None):
+    path = path or MODEL_PATH
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    np.save(path, weights)
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Train from NDJSON lines of {"text": ..., "label": ...}:
+    #   python text_classifier.py train data.ndjson [models/text_emotion.npy]
+    if len(sys.argv) < 3 or sys.argv[1] != "train":
+        print("Usage: python text_classifier.py train data.ndjson [model.npy]")
+        sys.exit(1)
+
+    texts, labels = [], []
+    with open(sys.argv[2], encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                texts.append(item["text"])
+                labels.append(item["label"])
+    model_path = sys.argv[3] if len(sys.argv) > 3 else MODEL_PATH
+    save(train(texts, labels), model_path)
+    print(f"Trained on {len(texts)} texts, saved to {model_path}")
@@ -1,9 +1,18 @@
-from textblob import TextBlob
+import argparse
+import fileinput
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import threading
+
+import sentiment_engine
 
 def detect_text_emotion(text):
-    analysis = TextBlob(text)
-    polarity = analysis.sentiment.polarity
+    return emotion_from_polarity(sentiment_engine.polarity(text))
 
+def emotion_from_polarity(polarity):
     if polarity > 0:
         return "Positive"
     elif polarity < 0:
@@ -11,7 +20,103 @@ def detect_text_emotion(text):
     else:
         return "Neutral"
 
+def score_line(item):
+    """Pool worker: (line number, text) -> (line number, emotion, polarity)."""
+    line_no, text = item
+    polarity = sentiment_engine.polarity(text)
+    return line_no, emotion_from_polarity(polarity), polarity
+
+def read_checkpoint(path):
+    """Return (lines done, output byte offset) from a checkpoint file."""
+    if path and os.path.exists(path):
+        with open(path) as f:
+            state = json.load(f)
+        return state["lines_done"], state.get("output_offset")
+    return 0, None
+
+def write_checkpoint(path, lines_done, out):
+    # Write then rename so an interrupted run never leaves a torn checkpoint.
+    out.flush()
+    offset = out.tell() if out.seekable() else None
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"lines_done": lines_done, "output_offset": offset}, f)
+    os.replace(tmp, path)
+
+def score_stream(lines, out, processes=None, chunksize=256, ordered=True, start=0,
+                 checkpoint=None, checkpoint_every=10000):
+    """Score (line number, text) pairs on a process pool and write NDJSON to out.
+
+    At most a few chunks per worker are in flight, so memory stays constant
+    however long the input is. The checkpoint records how many leading lines
+    are fully written and the output size at that point; with unordered
+    output, lines finished past that mark may be written again after a resume.
+    """
+    processes = processes or os.cpu_count() or 1
+    in_flight = threading.BoundedSemaphore(chunksize * processes * 4)
+    stop = threading.Event()
+
+    def feed():
+        # Runs on the pool's task-handler thread, which terminate() joins: never
+        # block on the semaphore for good, or Ctrl-C and worker errors hang here
+        for item in lines:
+            while not in_flight.acquire(timeout=0.1):
+                if stop.is_set():
+                    return
+            yield item
+
+    done = start        # every line before this one has been written
+    finished = set()    # unordered mode: written lines at or past `done`
+    with multiprocessing.Pool(processes, initializer=sentiment_engine.load) as pool:
+        try:
+            results = (pool.imap if ordered else pool.imap_unordered)(score_line, feed(), chunksize)
+            for line_no, emotion, polarity in results:
+                in_flight.release()
+                out.write(json.dumps({"line": line_no, "emotion": emotion, "polarity": polarity}) + "\n")
+                finished.add(line_no)
+                while done in finished:
+                    finished.remove(done)
+                    done += 1
+                    if checkpoint and done % checkpoint_every == 0:
+                        write_checkpoint(checkpoint, done, out)
+        finally:
+            stop.set()
+    out.flush()
+    if checkpoint:
+        write_checkpoint(checkpoint, done, out)
+    return done
+
 if __name__ == "__main__":
-    text = input("Enter a text: ")
-    emotion = detect_text_emotion(text)
-    print(f"Detected Emotion: {emotion}")
+    parser = argparse.ArgumentParser(description="Detect text emotion, one input line per text.")
+    parser.add_argument("files", nargs="*", help="input files (default: stdin)")
+    parser.add_argument("-o", "--output", help="NDJSON output file (default: stdout)")
+    parser.add_argument("-j", "--processes", type=int, default=None)
+    parser.add_argument("--chunksize", type=int, default=256)
+    parser.add_argument("--unordered", action="store_true", help="write results as they finish")
+    parser.add_argument("--checkpoint", help="file recording progress, used to resume")
+    parser.add_argument("--checkpoint-every", type=int, default=10000)
+    args = parser.parse_args()
+
+    if not args.files and sys.stdin.isatty():
+        text = input("Enter a text: ")
+        emotion = detect_text_emotion(text)
+        print(f"Detected Emotion: {emotion}")
+        sys.exit(0)
+
+    start, offset = read_checkpoint(args.checkpoint)
+    if args.output:
+        # On resume, drop output written after the last checkpoint
+        out = open(args.output, "a" if start else "w", encoding="utf-8")
+        if offset is not None:
+            out.truncate(offset)
+    else:
+        out = sys.stdout
+    with fileinput.input(args.files or ["-"], encoding="utf-8", errors="replace") as f:
+        lines = itertools.islice(((n, line.rstrip("\r\n")) for n, line in enumerate(f)), start, None)
+        try:
+            done = score_stream(lines, out, args.processes, args.chunksize, not args.unordered,
+                                start, args.checkpoint, args.checkpoint_every)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+    print(f"Scored {done - start} lines ({done} total)", file=sys.stderr)
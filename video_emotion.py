@@ -0,0 +1,138 @@
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import subprocess
+import sys
+
+import numpy as np
+from moviepy.config import get_setting
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+import detectors
+import face_pipeline
+
+# Offline emotion timeline for recorded sessions.
+# ffmpeg resamples the video to `sample_fps` itself, so skipped frames never
+# reach Python, and each sampled frame is read into one reused buffer. Long
+# videos are cut into segments scored in parallel by a process pool; the
+# timeline is written as NDJSON, one line per second, as segments finish.
+
+
+def probe(path):
+    """Duration (seconds), frame rate and (width, height) of a video file."""
+    infos = ffmpeg_parse_infos(path)
+    return infos["duration"], infos["video_fps"], tuple(infos["video_size"])
+
+
+def iter_frames(path, sample_fps=2.0, start=0.0, duration=None, max_width=0, size=None):
+    """Yield (seconds, BGR frame) sampled at sample_fps from path.
+
+    Frames wider than max_width are downscaled by ffmpeg. The yielded frame
+    is a reused buffer, overwritten by the next one. size, the video's
+    (width, height), saves probing the file again.
+    """
+    width, height = size or probe(path)[2]
+    if max_width and width > max_width:
+        height = int(round(height * max_width / width / 2)) * 2
+        width = max_width
+    cmd = [get_setting("FFMPEG_BINARY"), "-loglevel", "error", "-ss", "%.3f" % start]
+    if duration is not None:
+        cmd += ["-t", "%.3f" % duration]
+    cmd += ["-i", path, "-an", "-vf", "fps=%g,scale=%d:%d" % (sample_fps, width, height),
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-"]
+
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    buf = memoryview(frame).cast("B")
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, bufsize=frame.nbytes)
+    try:
+        n = 0
+        while proc.stdout.readinto(buf) == frame.nbytes:
+            t = start + n / sample_fps
+            # ffmpeg's fps filter may round one frame past -t; it belongs to the next segment
+            if duration is not None and t >= start + duration:
+                break
+            yield t, frame
+            n += 1
+    finally:
+        proc.stdout.close()
+        proc.kill()
+        proc.wait()
+
+
+def analyze_segment(job):
+    """Pool worker: (path, start, duration, sample_fps, max_width, size) -> per-second records."""
+    path, start, duration, sample_fps, max_width, size = job
+    detector = detectors.get("face")
+    seconds = {}  # second -> [frames, crops of the largest face]
+    for t, frame in iter_frames(path, sample_fps, start, duration, max_width, size):
+        second = seconds.setdefault(int(t), [0, []])
+        second[0] += 1
+        boxes = face_pipeline.find_faces(frame, detector)
+        if boxes:
+            box = max(boxes, key=lambda b: b[2] * b[3])
+            crops, _ = face_pipeline.face_crops(frame, [box])
+            second[1].extend(crops)
+
+    records = []
+    for second, (frames, crops) in sorted(seconds.items()):
+        record = {"second": second, "emotion": None, "emotions": None,
+                  "frames": frames, "frames_with_face": len(crops)}
+        if crops:
+            # One classifier call per second, averaged over its frames
+            scores = face_pipeline.classify(np.asarray(crops), detector).mean(axis=0)
+            record["emotions"] = face_pipeline.label_scores(scores)
+            record["emotion"] = face_pipeline.LABELS[int(scores.argmax())]
+        records.append(record)
+    return records
+
+
+def segments(path, segment_seconds=60, sample_fps=2.0, max_width=0):
+    """Split a video into pool jobs of at most segment_seconds each.
+
+    Segments are whole seconds long (at least one), so every per-second
+    record comes from a single segment. The video is probed once, here.
+    """
+    duration, _, size = probe(path)
+    segment_seconds = max(1, round(segment_seconds))
+    for i in range(math.ceil(duration / segment_seconds)):
+        start = i * segment_seconds
+        yield path, start, min(segment_seconds, duration - start), sample_fps, max_width, size
+
+
+def write_timeline(path, out, processes=None, segment_seconds=60, sample_fps=2.0, max_width=0):
+    """Score a video on a process pool and write its per-second timeline to out.
+
+    Results are written in order as segments finish, so memory holds at most
+    a few segments' records whatever the video length. Returns seconds written.
+    """
+    processes = processes or os.cpu_count() or 1
+    written = 0
+    with multiprocessing.Pool(processes, initializer=detectors.preload, initargs=(["face"],)) as pool:
+        jobs = segments(path, segment_seconds, sample_fps, max_width)
+        for records in pool.imap(analyze_segment, jobs):
+            for record in records:
+                out.write(json.dumps(record) + "\n")
+            out.flush()
+            written += len(records)
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-second facial emotion timeline of a video, as NDJSON.")
+    parser.add_argument("video")
+    parser.add_argument("-o", "--output", help="NDJSON output file (default: stdout)")
+    parser.add_argument("-j", "--processes", type=int, default=None)
+    parser.add_argument("--fps", type=float, default=2.0, help="frames sampled per second")
+    parser.add_argument("--segment", type=int, default=60, help="whole seconds per pool job")
+    parser.add_argument("--max-width", type=int, default=0, help="downscale frames wider than this (0 keeps size)")
+    args = parser.parse_args()
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        seconds = write_timeline(args.video, out, args.processes, args.segment, args.fps, args.max_width)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"Wrote {seconds} seconds of timeline", file=sys.stderr)